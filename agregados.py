@@ -0,0 +1,193 @@
+"""Totais mantidos pelos backends junto com cada gravação.
+
+- Painel de compras: requisições por status, métier, tipo de compra e mês.
+  Cada requisição conta em exatamente um grupo, ajustado na mesma transação
+  que grava, muda o status ou apaga a requisição.
+- Demanda do almoxarifado: quantidade total, número de solicitações e data
+  da última solicitação de cada MABEC.
+
+Assim as telas leem só os totais, nunca a coleção inteira.
+"""
+import hashlib
+import json
+
+CAMPOS = ("Status", "Métier", "Tipo de Compra", "Mês")
+
+# Diferença de valor abaixo da qual dois totais são considerados iguais
+TOLERANCIA = 0.005
+
+
+def grupo(dados):
+    tipo_compra = dados.get('Tipo de Compra', dados.get('Tipo de compra'))
+    return (
+        str(dados.get('Status') or ''),
+        str(dados.get('Métier') or '').strip(),
+        str(tipo_compra or ''),
+        str(dados.get('Data Solicitação') or '')[:7],
+    )
+
+
+def valor(dados):
+    try:
+        return float(dados.get('Valor Total') or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def id_grupo(chave):
+    # Métier é texto livre; o hash evita caracteres proibidos em IDs do Firestore
+    return hashlib.sha1(json.dumps(chave, ensure_ascii=False).encode()).hexdigest()[:20]
+
+
+def variacao(antes=None, depois=None, acumulado=None):
+    """{grupo: [quantidade, valor]} a somar quando uma requisição passa de antes a depois.
+
+    ``antes`` None é uma criação e ``depois`` None uma exclusão. Com
+    ``acumulado``, soma nele (para juntar várias requisições num só ajuste).
+    """
+    acumulado = {} if acumulado is None else acumulado
+    for dados, sinal in ((antes, -1), (depois, 1)):
+        if dados:
+            total = acumulado.setdefault(grupo(dados), [0, 0.0])
+            total[0] += sinal
+            total[1] += sinal * valor(dados)
+    return acumulado
+
+
+def sem_efeito(ajuste):
+    return {chave: total for chave, total in ajuste.items() if total[0] or abs(total[1]) > TOLERANCIA}
+
+
+def somar(documentos):
+    """Recalcula todos os grupos a partir das requisições."""
+    totais = {}
+    for dados in documentos:
+        variacao(depois=dados, acumulado=totais)
+    return totais
+
+
+def grupos_de(documentos):
+    """{grupo: [quantidade, valor]} a partir dos documentos da coleção 'agregados'."""
+    return {
+        tuple(dados.get(campo, "") for campo in CAMPOS): [dados.get("Quantidade", 0), dados.get("Valor", 0.0)]
+        for dados in documentos
+    }
+
+
+def reconciliar(armazenamento, corrigir=False):
+    """Compara os grupos gravados com uma recontagem da coleção.
+
+    Retorna [(grupo, gravado, esperado)] para cada grupo divergente e, com
+    ``corrigir``, regrava esses grupos com o valor recontado. Gravações feitas
+    durante a recontagem podem aparecer como divergência falsa; rode de novo
+    antes de corrigir em horário de uso.
+    """
+    esperado = somar(armazenamento.listar("requisicoes").values())
+    gravado = armazenamento.agregados()
+    divergentes = []
+    for chave in sorted(set(esperado) | set(gravado)):
+        atual = gravado.get(chave, [0, 0.0])
+        correto = esperado.get(chave, [0, 0.0])
+        if atual[0] != correto[0] or abs(atual[1] - correto[1]) > TOLERANCIA:
+            divergentes.append((chave, atual, correto))
+    if corrigir and divergentes:
+        armazenamento.corrigir_agregados({chave: correto for chave, _, correto in divergentes})
+    return divergentes
+
+
+# ---- demanda por MABEC ----
+
+def mabec(dados):
+    return str(dados.get('MABEC') or '').strip()
+
+
+def quantidade(dados):
+    try:
+        return int(float(dados.get('Quantidade') or 0))
+    except (TypeError, ValueError):
+        return 0
+
+
+def variacao_mabec(doc_id, antes=None, depois=None, acumulado=None):
+    """Mudança nos totais de cada MABEC quando o item doc_id passa de antes a depois.
+
+    Além das somas, guarda a maior data incluída e a maior removida: se um
+    item removido era o mais recente, a última data precisa ser relida.
+    """
+    acumulado = {} if acumulado is None else acumulado
+    for dados, sinal in ((antes, -1), (depois, 1)):
+        if not dados or not mabec(dados):
+            continue
+        mudanca = acumulado.setdefault(mabec(dados), {
+            "quantidade": 0, "solicitacoes": 0, "incluida": "", "removida": "", "removidos": set(),
+        })
+        mudanca["quantidade"] += sinal * quantidade(dados)
+        mudanca["solicitacoes"] += sinal
+        data = str(dados.get('Data Solicitação') or '')
+        if sinal > 0:
+            mudanca["incluida"] = max(mudanca["incluida"], data)
+        else:
+            mudanca["removida"] = max(mudanca["removida"], data)
+            mudanca["removidos"].add(doc_id)
+    return acumulado
+
+
+def precisa_reler_ultima(atual, mudanca):
+    ultima = (atual or {}).get("Última Solicitação") or ""
+    return bool(mudanca["removidos"]) and mudanca["removida"] >= ultima and mudanca["incluida"] < mudanca["removida"]
+
+
+def total_mabec(atual, mudanca, ultima_restante=None):
+    """Totais de um MABEC depois da mudança, ou None se não sobrou nenhum item.
+
+    ``ultima_restante`` (maior data entre os itens que ficaram) só é usado
+    quando ``precisa_reler_ultima``.
+    """
+    atual = atual or {"Quantidade Total": 0, "Solicitações": 0, "Última Solicitação": ""}
+    solicitacoes = atual["Solicitações"] + mudanca["solicitacoes"]
+    if solicitacoes <= 0:
+        return None
+    if precisa_reler_ultima(atual, mudanca):
+        ultima = max(ultima_restante or "", mudanca["incluida"])
+    else:
+        ultima = max(atual["Última Solicitação"] or "", mudanca["incluida"])
+    return {
+        "Quantidade Total": atual["Quantidade Total"] + mudanca["quantidade"],
+        "Solicitações": solicitacoes,
+        "Última Solicitação": ultima,
+    }
+
+
+def reconciliar_mabec(armazenamento, corrigir=False):
+    """Compara a demanda por MABEC gravada com uma recontagem do almoxarifado.
+
+    Retorna [(MABEC, gravado, esperado)] para cada MABEC divergente (None onde
+    o total não existe) e, com ``corrigir``, substitui todos os totais pela
+    recontagem. Funciona com qualquer backend.
+    """
+    esperado = somar_mabec(armazenamento.listar("almoxarifado"))
+    gravado = armazenamento.totais_mabec()
+    divergentes = [
+        (codigo, gravado.get(codigo), esperado.get(codigo))
+        for codigo in sorted(set(esperado) | set(gravado))
+        if gravado.get(codigo) != esperado.get(codigo)
+    ]
+    if corrigir and divergentes:
+        armazenamento.corrigir_totais_mabec(esperado)
+    return divergentes
+
+
+def mabecs_de(documentos):
+    """{MABEC: totais} a partir dos documentos da coleção 'totais_mabec'."""
+    return {
+        dados["MABEC"]: {campo: dados.get(campo) for campo in ("Quantidade Total", "Solicitações", "Última Solicitação")}
+        for dados in documentos
+    }
+
+
+def somar_mabec(documentos):
+    """Recalcula os totais de todos os MABECs a partir dos itens {id: dados}."""
+    acumulado = {}
+    for doc_id, dados in documentos.items():
+        variacao_mabec(doc_id, depois=dados, acumulado=acumulado)
+    return {codigo: total_mabec(None, mudanca) for codigo, mudanca in acumulado.items()}
@@ -0,0 +1,138 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import shutil
+import tempfile
+from functools import lru_cache
+
+TAMANHO_BLOCO = 1024 * 1024
+
+# Anexos são guardados uma única vez, pelo hash do conteúdo
+PASTA_OBJETOS = os.path.join("uploads", "objetos")
+TAMANHO_MAXIMO = int(os.environ.get("REQUIS_ANEXO_MAX_MB", "20")) * 1024 * 1024
+COMPRIMIR = os.environ.get("REQUIS_ANEXO_COMPRIMIR", "0") == "1"
+EXTENSOES_COMPRIMIVEIS = {".doc", ".docx", ".png", ".jpg", ".jpeg"}
+# Só vale guardar comprimido se economizar pelo menos 10%
+GANHO_MINIMO = 0.9
+
+
+class AnexoMuitoGrande(ValueError):
+    pass
+
+
+@lru_cache(maxsize=4096)
+def _metadados(caminho, modificado_ns, tamanho):
+    # A chave inclui data de modificação e tamanho: arquivo alterado gera nova entrada
+    sha256 = hashlib.sha256()
+    with open(caminho, "rb") as f:
+        for bloco in iter(lambda: f.read(TAMANHO_BLOCO), b""):
+            sha256.update(bloco)
+    return {
+        "nome": os.path.basename(caminho),
+        "tamanho": tamanho,
+        "sha256": sha256.hexdigest(),
+        "mime": mimetypes.guess_type(caminho)[0] or "application/octet-stream",
+    }
+
+
+def metadados_anexo(caminho):
+    """Nome, tamanho, hash e tipo do anexo, ou None se o arquivo não existir."""
+    caminho = str(caminho or "")
+    if not caminho or not os.path.isfile(caminho):
+        return None
+    info = os.stat(caminho)
+    return _metadados(caminho, info.st_mtime_ns, info.st_size)
+
+
+def ler_anexo(caminho):
+    # Usado como data= (adiado) de um st.download_button: só roda quando o usuário clica
+    with open(caminho, "rb") as f:
+        return f.read()
+
+
+def _caminho_objeto(sha256, comprimido):
+    nome = sha256 + (".gz" if comprimido else "")
+    return os.path.join(PASTA_OBJETOS, sha256[:2], nome)
+
+
+def _comprimir(origem, destino):
+    with open(origem, "rb") as entrada, gzip.open(destino, "wb") as saida:
+        shutil.copyfileobj(entrada, saida, TAMANHO_BLOCO)
+    return os.path.getsize(destino)
+
+
+def salvar_anexo(arquivo, nome, tamanho_maximo=TAMANHO_MAXIMO, comprimir=COMPRIMIR):
+    """Grava um upload em blocos e devolve a referência a ser guardada na requisição.
+
+    O conteúdo é gravado num arquivo temporário enquanto o hash é calculado;
+    se já existir um objeto com o mesmo hash, o temporário é descartado e a
+    referência aponta para o objeto existente. Levanta AnexoMuitoGrande se
+    o upload passar de tamanho_maximo bytes.
+    """
+    if getattr(arquivo, "size", 0) > tamanho_maximo:
+        raise AnexoMuitoGrande(nome)
+    os.makedirs(PASTA_OBJETOS, exist_ok=True)
+    arquivo.seek(0)
+
+    sha256 = hashlib.sha256()
+    tamanho = 0
+    descritor, temporario = tempfile.mkstemp(dir=PASTA_OBJETOS, suffix=".parcial")
+    try:
+        with os.fdopen(descritor, "wb") as saida:
+            for bloco in iter(lambda: arquivo.read(TAMANHO_BLOCO), b""):
+                tamanho += len(bloco)
+                if tamanho > tamanho_maximo:
+                    raise AnexoMuitoGrande(nome)
+                sha256.update(bloco)
+                saida.write(bloco)
+        sha256 = sha256.hexdigest()
+
+        comprimido = False
+        existente = next(
+            (c for c in (_caminho_objeto(sha256, False), _caminho_objeto(sha256, True)) if os.path.exists(c)),
+            None
+        )
+        if existente:
+            comprimido = existente.endswith(".gz")
+        else:
+            origem = temporario
+            extensao = os.path.splitext(nome)[1].lower()
+            if comprimir and extensao in EXTENSOES_COMPRIMIVEIS:
+                if _comprimir(temporario, temporario + ".gz") < tamanho * GANHO_MINIMO:
+                    origem = temporario + ".gz"
+                    comprimido = True
+            destino = _caminho_objeto(sha256, comprimido)
+            os.makedirs(os.path.dirname(destino), exist_ok=True)
+            os.replace(origem, destino)
+    finally:
+        for sobra in (temporario, temporario + ".gz"):
+            if os.path.exists(sobra):
+                os.remove(sobra)
+
+    return {
+        "nome": nome,
+        "tamanho": tamanho,
+        "sha256": sha256,
+        "mime": mimetypes.guess_type(nome)[0] or "application/octet-stream",
+        "comprimido": comprimido,
+    }
+
+
+def ler_objeto(referencia):
+    caminho = _caminho_objeto(referencia["sha256"], referencia.get("comprimido", False))
+    abrir = gzip.open if referencia.get("comprimido") else open
+    with abrir(caminho, "rb") as f:
+        return f.read()
+
+
+def objeto_existe(referencia):
+    return os.path.isfile(_caminho_objeto(referencia["sha256"], referencia.get("comprimido", False)))
+
+
+def tamanho_legivel(tamanho):
+    for unidade in ("B", "KB", "MB"):
+        if tamanho < 1024:
+            return f"{tamanho:.0f} {unidade}"
+        tamanho /= 1024
+    return f"{tamanho:.1f} GB"
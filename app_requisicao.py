@@ -1,27 +1,159 @@
-import streamlit as st
-import pandas as pd
+import time
+_inicio_execucao = time.perf_counter()
+
 import os
-import base64
+import tempfile
+import streamlit as st
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as TempoEsgotado
 from datetime import datetime
-import firebase_admin
-from firebase_admin import credentials, firestore
+from functools import partial
+from anexos import TAMANHO_MAXIMO as TAMANHO_MAXIMO_ANEXO
+from anexos import AnexoMuitoGrande, ler_anexo, ler_objeto, metadados_anexo, objeto_existe, salvar_anexo, tamanho_legivel
+from agregados import CAMPOS as CAMPOS_PAINEL
+from agregados import grupos_de, mabecs_de, reconciliar, reconciliar_mabec
+from armazenamento import COLECAO_AGREGADOS, COLECAO_MABEC, ErroArmazenamento, Pagina, criar_armazenamento
+from espelho import EspelhoColecao
+from exportacao import exportar, intervalo, parquet_disponivel
+from fila import FilaEnvios, ler_diario
+from indice import IndiceTexto
+from itens import preparar_requisicao, resumir_itens, tabela_itens
+from consultas import normalizar
+from desempenho import ArmazenamentoMedido, MedicaoRerun, RelatorioInicializacao, etapa, no_rerun
+from numeracao import AlocadorNumeros
+
+# Etapas, leituras e elementos deste rerun (ver o painel lateral com ?debug=1)
+medicao = MedicaoRerun(_inicio_execucao)
+
+def conectar_firestore():
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    # Só inicializa uma vez
+    if not firebase_admin._apps:
+        # Carregar a chave do secrets
+        firebase_config = dict(st.secrets["firebase"])
 
-# Só inicializa uma vez
-if not firebase_admin._apps:
-    import json
+        cred = credentials.Certificate(firebase_config)
+        firebase_admin.initialize_app(cred)
 
-    # Carregar a chave do secrets
-    firebase_config = dict(st.secrets["firebase"])
+    return firestore.client()
+
+# Firestore ou SQLite, conforme REQUIS_BACKEND; um por processo, criado
+# só quando alguma aba precisa dele
+@st.cache_resource
+def obter_armazenamento():
+    return ArmazenamentoMedido(criar_armazenamento(conectar_firestore=conectar_firestore))
+
+# Leituras independentes do histórico rodam em paralelo neste pool
+@st.cache_resource
+def obter_executor_leituras():
+    return ThreadPoolExecutor(max_workers=8, thread_name_prefix="leituras")
+
+def aguardar_leitura(futuro, descricao, padrao):
+    try:
+        with etapa(f"aguardar {descricao}"):
+            return futuro.result(timeout=TEMPO_LIMITE_LEITURA)
+    except TempoEsgotado:
+        st.warning(f"A leitura de {descricao} passou de {TEMPO_LIMITE_LEITURA} s. Recarregue a página para tentar de novo.")
+    except ErroArmazenamento as erro:
+        st.error(f"Falha ao ler {descricao}: {erro}")
+    return padrao
+
+# Um alocador por processo: a sequência é compartilhada por todas as sessões
+@st.cache_resource
+def obter_alocador():
+    return AlocadorNumeros()
+
+# Envios são anotados num diário local e gravados em segundo plano
+CAMINHO_FILA = os.environ.get("REQUIS_FILA", "fila_envios.jsonl")
+
+@st.cache_resource
+def obter_fila():
+    return FilaEnvios(CAMINHO_FILA, obter_armazenamento(), alocador=obter_alocador())
+
+# Se o processo anterior parou com envios pendentes, retoma a gravação. Vale só na
+# partida: depois disso, envios novos passam por obter_fila(). Rejeitados sozinhos
+# no diário não contam, para não criar o armazenamento em toda aba
+@st.cache_resource
+def retomar_fila_pendente():
+    pendentes, _, _ = ler_diario(CAMINHO_FILA)
+    if pendentes:
+        obter_fila()
+
+@st.cache_resource
+def obter_relatorio_inicializacao():
+    return RelatorioInicializacao()
+
+TAMANHO_PAGINA_STATUS = 20
+
+# Linhas exportadas pela aba, no máximo; exportações maiores pela linha de comando
+# (exportacao.py), que grava direto no arquivo sem guardar a exportação em memória
+LINHAS_MAXIMAS_EXPORTACAO = 50000
+TAMANHO_PAGINA_ALMOX = 50
+
+# Segundos que o histórico espera por cada leitura antes de desistir dela
+TEMPO_LIMITE_LEITURA = 20
+
+# Seções do histórico e a mensagem mostrada quando estão vazias
+SECOES_HISTORICO = {
+    "Ainda Não Tratadas": "Não há solicitações pendentes para aprovação do Comitê de Compras.",
+    "Tratadas": "Não há solicitações com status diferente de 'Aprovação Comitê de Compras'.",
+    "a Serem Reapresentadas": "Não há solicitações marcadas para reapresentação.",
+}
+
+STATUS_OPCOES = [
+    "Aprovação Comitê de Compras", "Criação da RC", "Aprovação Fabio Silva",
+    "Aprovação Federico Mateos", "Criação Pedido de Compra", "Aguardando Nota fiscal",
+    "Aguardando entrega", "Entregue", "Serviço realizado", "Pago",
+    "Solicitação Recusada", "Cancelado", "Reapresentar"
+]
 
-    cred = credentials.Certificate(firebase_config)
-    if not firebase_admin._apps:
-        firebase_admin.initialize_app(cred)
+COLUNAS_REQUISICAO = [
+    'Número Solicitação', 'Nome do Solicitante', 'Métier', 'Tipo', 'Itens',
+    'Linha de Projeto', 'Produto Novo ou Backup', 'Demanda Nova ou Prevista',
+    'Valor Total', 'Orçamento', 'Caminho Orçamento', 'Comentários', 'Riscos', 'Status',
+    'Data Solicitação', 'Tipo de Compra'
+]
+
+# Espelho em memória compartilhado por todas as sessões do processo
+@st.cache_resource
+def obter_espelho(colecao):
+    if colecao == "requisicoes":
+        return EspelhoColecao(obter_armazenamento(), colecao, transformar=preparar_requisicao)
+    return EspelhoColecao(obter_armazenamento(), colecao)
+
+# Totais do painel e por MABEC: depois da carga, cada rerun não lê nada do banco
+def ler_grupos():
+    return obter_espelho(COLECAO_AGREGADOS).derivado("grupos", grupos_de)
+
+def ler_totais_mabec():
+    return obter_espelho(COLECAO_MABEC).derivado("totais", mabecs_de)
+
+# Busca por palavras do histórico, atualizada pelo espelho a cada mudança
+@st.cache_resource
+def obter_indice():
+    indice = IndiceTexto()
+    obter_espelho("requisicoes").inscrever(indice.atualizar)
+    return indice
+
+def carregar_historico(espelho):
+    return espelho.derivado("historico", montar_historico), espelho.derivado("itens", tabela_itens)
 
-db = firestore.client()
+def montar_historico(documentos):
+    import pandas as pd
 
-# Caminho dos arquivos
-REQ_FILE = "requisicoes.csv"
-ALMOX_FILE = "almox.csv"
+    # Feito uma vez por versão da coleção e compartilhado entre as sessões
+    with etapa("historico.montar_dataframe"):
+        df = pd.DataFrame(documentos, columns=COLUNAS_REQUISICAO).drop(columns=['Itens'])
+        df['Data Solicitação'] = pd.to_datetime(df['Data Solicitação'], errors='coerce')
+        df['Valor Total'] = pd.to_numeric(df['Valor Total'], errors='coerce').fillna(0.0)
+        df = df.fillna({coluna: "" for coluna in df.columns if coluna not in ('Data Solicitação', 'Valor Total')})
+        df['Situação'] = df['Status'].map({
+            "Aprovação Comitê de Compras": "Ainda Não Tratadas",
+            "Reapresentar": "a Serem Reapresentadas",
+        }).fillna("Tratadas")
+        return df.sort_values(by="Data Solicitação", ascending=False)
 
 st.set_page_config(page_title="Sistema de Requisições", layout="wide")
 
@@ -65,52 +197,87 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 def gerar_numero():
-    return f"REQ-{datetime.now().strftime('%Y%m%d%H%M%S')}"
-
-def gerar_link_download(caminho_arquivo):
-    caminho_arquivo = str(caminho_arquivo) if not pd.isna(caminho_arquivo) else ""
-    if caminho_arquivo and os.path.exists(caminho_arquivo) and os.path.isfile(caminho_arquivo):
-        with open(caminho_arquivo, "rb") as f:
-            data = f.read()
-        b64 = base64.b64encode(data).decode()
-        href = f'<a href="data:file/octet-stream;base64,{b64}" download="{os.path.basename(caminho_arquivo)}">📥 Baixar Orçamento</a>'
-        return href
-    else:
-        return "Nenhum arquivo anexado"
-
-# Verificação inicial dos arquivos
-if not os.path.exists(REQ_FILE):
-    pd.DataFrame(columns=[
-        'Número Solicitação', 'Nome do Solicitante', 'Métier', 'Tipo', 'Itens',
-        'Linha de Projeto', 'Produto Novo ou Backup', 'Demanda Nova ou Prevista', 
-        'Valor Total', 'Caminho Orçamento', 'Comentários', 'Riscos', 'Status', 
-        'Data Solicitação', 'Tipo de Compra'
-    ]).to_csv(REQ_FILE, index=False)
-
-if not os.path.exists(ALMOX_FILE):
-    pd.DataFrame(columns=[
-        'Nome do Solicitante', 'MABEC', 'Descrição do Produto', 'Quantidade', 'Data Solicitação'
-    ]).to_csv(ALMOX_FILE, index=False)
+    return obter_alocador().proximo()
 
-if 'df_requisicoes' not in st.session_state:
-    st.session_state.df_requisicoes = pd.read_csv(REQ_FILE)
-
-if 'df_almox' not in st.session_state:
-    st.session_state.df_almox = pd.read_csv(ALMOX_FILE)
+def mostrar_download(referencia, caminho_arquivo):
+    # Só os metadados são lidos aqui; o conteúdo é lido no clique
+    if isinstance(referencia, dict) and objeto_existe(referencia):
+        anexo, ler = referencia, partial(ler_objeto, referencia)
+    else:
+        # Requisições antigas guardam só o caminho do arquivo
+        anexo, ler = metadados_anexo(caminho_arquivo), partial(ler_anexo, caminho_arquivo)
+    if anexo is None:
+        st.write("Nenhum arquivo anexado")
+        return
+    st.download_button(
+        f"📥 Baixar Orçamento ({anexo['nome']}, {tamanho_legivel(anexo['tamanho'])})",
+        data=ler,
+        file_name=anexo['nome'],
+        mime=anexo['mime'],
+        on_click="ignore"
+    )
+
+def mostrar_detalhe(row, itens_df):
+    st.write(f"**Número Solicitação:** {row['Número Solicitação']}")
+    st.write(f"**Data Solicitação:** {row['Data Solicitação']}")
+    st.write(f"**Nome do Solicitante:** {row['Nome do Solicitante']}")
+    st.write(f"**Métier:** {row['Métier']}")
+    st.write(f"**Tipo:** {row['Tipo']}")
+    st.write(f"**Produto Novo ou Backup:** {row['Produto Novo ou Backup'] or 'Não informado'}")
+    st.write(f"**Demanda Nova ou Prevista:** {row['Demanda Nova ou Prevista']}")
+    st.write(f"**Linha de Projeto:** {row['Linha de Projeto']}")
+    st.write(f"**Tipo de Compra:** {row['Tipo de Compra']}")
+    mostrar_itens(itens_df, row['Número Solicitação'])
+    st.write(f"**Valor Total:** R$ {formatar_reais(row['Valor Total'])}")
+    st.write(f"**Riscos:** {row['Riscos']}")
+    st.write(f"**Comentários:** {row['Comentários']}")
+    st.write(f"**Status:** {row['Status']}")
+    mostrar_download(row['Orçamento'], row['Caminho Orçamento'])
+
+def gerar_exportacao(armazenamento, colecao, formato, inicio, fim, status):
+    # Roda só no clique. A leitura vai página a página para um arquivo temporário,
+    # mas o download_button precisa do arquivo inteiro em memória (e o Streamlit
+    # guarda uma cópia): por isso a aba para em LINHAS_MAXIMAS_EXPORTACAO linhas
+    with etapa("historico.exportacao"), tempfile.TemporaryFile() as destino:
+        exportar(armazenamento, colecao, destino, formato, inicio, fim, status, limite=LINHAS_MAXIMAS_EXPORTACAO)
+        destino.seek(0)
+        return destino.read()
+
+def formatar_reais(valor):
+    return f"{valor:,.2f}".replace(",", "v").replace(".", ",").replace("v", ".")
+
+def mostrar_itens(itens_df, numero):
+    if numero not in itens_df.index:
+        st.write("**Itens:** nenhum item informado")
+        return
+    st.write("**Itens:**")
+    for item in itens_df.loc[[numero]].to_dict(orient='records'):
+        st.markdown(
+            f"{item['Item']}. **Descrição:** {item['Descrição']} | "
+            f"**Qtd:** {item['Quantidade']} | "
+            f"**Unitário:** R$ {formatar_reais(item['Valor Unitário'])} | "
+            f"**Subtotal:** R$ {formatar_reais(item['Subtotal'])}"
+        )
 
 if 'itens' not in st.session_state:
     st.session_state.itens = []
 
 # Título principal
 st.markdown('<div class="titulo-principal">RENAULT</div>', unsafe_allow_html=True)
+relatorio_inicializacao = obter_relatorio_inicializacao()
+relatorio_inicializacao.registrar_pintura(time.perf_counter() - _inicio_execucao)
+
+retomar_fila_pendente()
 
 abas = [
     "Nova Solicitação de Requisição",
     "Conferir Status de Solicitação",
     "Solicitação Almox",
-    "Histórico (Acesso Restrito)"
+    "Histórico (Acesso Restrito)",
+    "Painel de Compras"
 ]
 aba = st.sidebar.selectbox("Selecione a aba", abas)
+_sobrecarga_rerun = time.perf_counter() - _inicio_execucao
 
 # ---- ABA NOVA REQUISIÇÃO ----
 if aba == "Nova Solicitação de Requisição":
@@ -173,54 +340,115 @@ if aba == "Nova Solicitação de Requisição":
             st.warning("Marque a caixa de confirmação antes de enviar a solicitação.")
         else:
             numero = gerar_numero()
-            caminho_arquivo = ""
-
-            if orcamento:
-                os.makedirs("uploads", exist_ok=True)
-                caminho_arquivo = os.path.join("uploads", f"{numero}_{orcamento.name}")
-                with open(caminho_arquivo, "wb") as f:
-                    f.write(orcamento.read())
-
-            nova_linha = pd.DataFrame([{
-                'Número Solicitação': numero,
-                'Nome do Solicitante': nome,
-                'Métier': metier,
-                'Tipo': tipo,
-                'Itens': str(st.session_state.itens),
-                'Linha de Projeto': projeto,
-                'Produto Novo ou Backup': novo_backup,
-                'Demanda Nova ou Prevista': demanda_tipo,
-                'Valor Total': valor_total,
-                'Caminho orçamento': caminho_arquivo,
-                'Comentários': comentarios,
-                'Riscos': riscos,
-                'Status': 'Aprovação Comitê de Compras',
-                'Data Solicitação': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'Tipo de compra': tipo_compra
-            }])
-
-            db.collection("requisicoes").add(nova_linha.to_dict(orient='records')[0])
-            st.session_state.itens = []
-            st.success(f"Solicitação enviada com sucesso! Número: {numero}")
+
+            anexo = None
+            try:
+                if orcamento:
+                    anexo = salvar_anexo(orcamento, orcamento.name)
+            except AnexoMuitoGrande:
+                st.error(f"O orçamento passa do limite de {tamanho_legivel(TAMANHO_MAXIMO_ANEXO)}.")
+            else:
+                nova_requisicao = {
+                    'Número Solicitação': numero,
+                    'Nome do Solicitante': nome,
+                    'Nome Busca': normalizar(nome),
+                    'Métier': metier,
+                    'Tipo': tipo,
+                    'Itens': list(st.session_state.itens),
+                    'Linha de Projeto': projeto,
+                    'Produto Novo ou Backup': novo_backup,
+                    'Demanda Nova ou Prevista': demanda_tipo,
+                    'Valor Total': valor_total,
+                    'Orçamento': anexo,
+                    'Comentários': comentarios,
+                    'Riscos': riscos,
+                    'Status': 'Aprovação Comitê de Compras',
+                    'Data Solicitação': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                    'Tipo de Compra': tipo_compra
+                }
+
+                obter_fila().enfileirar(nova_requisicao)
+                st.session_state.itens = []
+                st.success(f"Solicitação enviada com sucesso! Número: {numero}")
 
 # ---- ABA STATUS ----
 elif aba == "Conferir Status de Solicitação":
+    import pandas as pd
+
     st.title("Consultar Status da Solicitação")
+    armazenamento = obter_armazenamento()
     filtro_nome = st.text_input("Filtrar por Nome")
-    filtro_numero = st.text_input("Filtrar por Número da Solicitação")
-    docs = db.collection("requisicoes").stream()
-    df_data = [doc.to_dict() for doc in docs]
-    df = pd.DataFrame(df_data)
+    filtro_numero = st.text_input("Filtrar por Número da Solicitação").strip()
+
+    # Cada filtro novo recomeça da primeira página
+    chave_filtro = (normalizar(filtro_nome), filtro_numero.upper())
+    if st.session_state.get('status_filtro') != chave_filtro:
+        st.session_state.status_filtro = chave_filtro
+        st.session_state.status_cursores = [None]
+    cursor = st.session_state.status_cursores[-1]
+
+    # Lidos antes da página: o que for gravado no meio aparece nela e sai daqui
+    fila = obter_fila()
+    def na_busca(d):
+        return (
+            (not filtro_numero or filtro_numero.upper() in (d['Número Solicitação'], d.get('Número Original')))
+            and normalizar(d.get('Nome do Solicitante')).startswith(normalizar(filtro_nome))
+        )
+    aguardando = [d for d in fila.pendentes() if na_busca(d)]
 
-    if filtro_nome:
-        df = df[df['Nome do Solicitante'].str.lower().str.contains(filtro_nome.lower())]
     if filtro_numero:
-        df = df[df['Número Solicitação'].str.upper() == filtro_numero.upper()]
-
-    if df.empty:
-        st.info("Nenhuma solicitação encontrada.")
+        # Quem guardou o número do envio acha a requisição mesmo se ela foi renumerada
+        numero_gravado = fila.numero_gravado(filtro_numero.upper())
+        if numero_gravado:
+            st.info(
+                f"A solicitação {filtro_numero.upper()} foi gravada com o número {numero_gravado}, "
+                "porque o número original já estava em uso."
+            )
+        doc = armazenamento.obter_requisicao(numero_gravado or filtro_numero)
+        if doc and not normalizar(doc.get('Nome do Solicitante')).startswith(normalizar(filtro_nome)):
+            doc = None
+        pagina = Pagina([doc] if doc else [], None, False)
+    elif filtro_nome.strip():
+        pagina = armazenamento.pagina_por_nome(filtro_nome, TAMANHO_PAGINA_STATUS, cursor)
     else:
-        st.dataframe(df[['Número Solicitação', 'Nome do Solicitante', 'Status', 'Itens', 'Data Solicitação']], use_container_width=True)
+        pagina = armazenamento.pagina_recentes(TAMANHO_PAGINA_STATUS, cursor)
+
+    gravados = {d['Número Solicitação'] for d in pagina.documentos}
+    aguardando = [d for d in aguardando if d['Número Solicitação'] not in gravados]
+    if aguardando and cursor is None:
+        st.info(f"{len(aguardando)} solicitação(ões) recebida(s), aguardando gravação no banco.")
+        df_fila = pd.DataFrame(aguardando, columns=['Número Solicitação', 'Nome do Solicitante', 'Status', 'Itens', 'Data Solicitação'])
+        df_fila['Itens'] = df_fila['Itens'].map(resumir_itens)
+        st.dataframe(df_fila, width="stretch")
+    # Rejeições só aparecem para quem busca o número exato do envio
+    if filtro_numero and fila.rejeitado(filtro_numero.upper()):
+        st.warning(
+            f"Não foi possível gravar a solicitação {filtro_numero.upper()} porque o número já existia. "
+            "Envie-a novamente."
+        )
+        if st.button("Já reenviei, remover aviso"):
+            fila.descartar_rejeitado(filtro_numero.upper())
+            st.rerun()
+
+    if not pagina.documentos and not aguardando:
+        st.info("Nenhuma solicitação encontrada.")
+    elif pagina.documentos:
+        with etapa("status.desenhar_tabela"):
+            df = pd.DataFrame(pagina.documentos, columns=['Número Solicitação', 'Nome do Solicitante', 'Status', 'Itens', 'Data Solicitação'])
+            df['Itens'] = df['Itens'].map(resumir_itens)
+            st.dataframe(df, width="stretch")
+
+    col1, col2, col3 = st.columns([0.2, 0.6, 0.2])
+    with col1:
+        if st.button("⬅️ Anterior", disabled=len(st.session_state.status_cursores) == 1):
+            st.session_state.status_cursores.pop()
+            st.rerun()
+    with col2:
+        st.caption(f"Página {len(st.session_state.status_cursores)}")
+    with col3:
+        if st.button("Próxima ➡️", disabled=not pagina.tem_mais):
+            st.session_state.status_cursores.append(pagina.cursor)
+            st.rerun()
 
 # ---- ABA ALMOX ----
 elif aba == "Solicitação Almox":
@@ -263,19 +491,23 @@ elif aba == "Solicitação Almox":
             with col2:
                 if st.button("🗑️ Remover", key=f"remover_almox_{i}"):
                     st.session_state.almox_itens.pop(i)
-                    st.experimental_rerun()
+                    st.rerun()
 
         confirmar_envio_almox = st.checkbox("Confirmo que revisei todas as informações e desejo enviar a solicitação.")
         if st.button("Enviar Solicitação de Almoxarifado"):
             if not confirmar_envio_almox:
                 st.warning("Marque a caixa de confirmação antes de enviar.")
             else:
-                # Enviar cada item para o Firestore na coleção 'almoxarifado'
-                for item in st.session_state.almox_itens:
-                    db.collection("almoxarifado").add(item)
-                
-                st.session_state.almox_itens = []
-                st.success("Solicitação de almoxarifado enviada com sucesso!")
+                # Envia o pedido inteiro em lotes atômicos na coleção 'almoxarifado'
+                try:
+                    pedido, commits = obter_armazenamento().enviar_pedido_almox(st.session_state.almox_itens)
+                except ErroArmazenamento as erro:
+                    st.error(f"Não foi possível enviar a solicitação; nenhum item foi gravado. Tente novamente. ({erro})")
+                else:
+                    st.session_state.almox_itens = []
+                    st.success(f"Solicitação de almoxarifado enviada com sucesso! Pedido: {pedido}")
+                    for i, commit in enumerate(commits, start=1):
+                        st.caption(f"Lote {i}: {commit['itens']} itens em {commit['ms']:.0f} ms ({commit['tentativas']} tentativa(s))")
 
 # ---- ABA HISTÓRICO ----
 elif aba == "Histórico (Acesso Restrito)":
@@ -283,198 +515,288 @@ elif aba == "Histórico (Acesso Restrito)":
     senha = st.text_input("Digite a senha de administrador", type="password")
 
     if senha == "admin123":
-        docs = db.collection("requisicoes").stream()
-        df_data = [doc.to_dict() for doc in docs]
-        df = pd.DataFrame(df_data)
-
-        # Ordenar por data (mais recente primeiro)
-        df['Data Solicitação'] = pd.to_datetime(df['Data Solicitação'], errors='coerce')
-        df = df.sort_values(by="Data Solicitação", ascending=False)
+        import pandas as pd
+
+        armazenamento = obter_armazenamento()
+        espelho = obter_espelho("requisicoes")
+
+        # Dispara as duas leituras juntas; cada seção é desenhada assim que a sua chega
+        leituras = obter_executor_leituras()
+        futuro_requisicoes = leituras.submit(no_rerun(carregar_historico), espelho)
+        if 'almox_cursores' not in st.session_state:
+            st.session_state.almox_cursores = [None]
+        futuro_almox = leituras.submit(
+            no_rerun(armazenamento.pagina_recentes), TAMANHO_PAGINA_ALMOX, st.session_state.almox_cursores[-1], "almoxarifado"
+        )
+        obter_espelho(COLECAO_MABEC)
+        futuro_mabec = leituras.submit(no_rerun(ler_totais_mabec))
+
+        df, itens_df = aguardar_leitura(
+            futuro_requisicoes, "requisições", (montar_historico([]), tabela_itens([]))
+        )
+        indice = obter_indice()
+        with st.expander("Estatísticas do cache"):
+            st.json({**espelho.estatisticas(), "indice": indice.estatisticas()})
+
+        with st.expander("Exportar histórico"):
+            col1, col2 = st.columns(2)
+            with col1:
+                exp_colecao = st.radio(
+                    "Dados", ["requisicoes", "almoxarifado"], horizontal=True,
+                    format_func={"requisicoes": "Requisições (uma linha por item)", "almoxarifado": "Almoxarifado"}.get
+                )
+            with col2:
+                exp_formato = st.radio(
+                    "Formato", ["csv", "parquet"] if parquet_disponivel() else ["csv"], horizontal=True, format_func=str.upper
+                )
+            hoje = datetime.now().date()
+            periodo = st.date_input("Período", (hoje.replace(day=1), hoje), format="DD/MM/YYYY")
+            exp_status = st.multiselect("Status (todos se vazio)", STATUS_OPCOES, disabled=exp_colecao != "requisicoes")
+            if len(periodo) == 2:
+                de, ate = periodo
+                st.caption(
+                    f"Pela aba, a exportação para nas primeiras {LINHAS_MAXIMAS_EXPORTACAO:,} linhas do período"
+                    .replace(",", ".")
+                    + ". Para exportações maiores, use `python exportacao.py` no servidor."
+                )
+                st.download_button(
+                    "📥 Baixar exportação",
+                    data=partial(gerar_exportacao, armazenamento, exp_colecao, exp_formato, *intervalo(de, ate), exp_status or None),
+                    file_name=f"{exp_colecao}_{de:%Y%m%d}_{ate:%Y%m%d}.{exp_formato}",
+                    mime="text/csv" if exp_formato == "csv" else "application/vnd.apache.parquet",
+                    on_click="ignore"
+                )
+            else:
+                st.caption("Escolha a data final do período.")
 
         filtro_nome = st.text_input("Filtrar por nome (opcional)").strip()
         if filtro_nome:
-            df = df[df['Nome do Solicitante'].str.lower().str.contains(filtro_nome.lower())]
+            with etapa("historico.filtrar"):
+                df = df[df['Nome do Solicitante'].str.lower().str.contains(filtro_nome.lower(), na=False, regex=False)]
 
         filtro_numero = st.text_input("Filtrar por número da solicitação (opcional)").strip()
         if filtro_numero:
-            df = df[df['Número Solicitação'].str.upper() == filtro_numero.upper()]
-
-        # Separar as solicitações ainda não tratadas e tratadas
-        nao_tratadas = df[df['Status'] == "Aprovação Comitê de Compras"]
-        tratadas = df[df['Status'] != "Aprovação Comitê de Compras"]
-
-        st.subheader("Solicitações Ainda Não Tratadas")
-        if nao_tratadas.empty:
-            st.info("Não há solicitações pendentes para aprovação do Comitê de Compras.")
-
-        else:
-            import ast
-            for i, row in nao_tratadas.iterrows():
-                with st.expander(f"Solicitação: {row['Número Solicitação']} — {row['Nome do Solicitante']}"):
-                    st.write(f"**Número Solicitação:** {row['Número Solicitação']}")
-                    st.write(f"**Data Solicitação:** {row['Data Solicitação']}")
-                    st.write(f"**Nome do Solicitante:** {row['Nome do Solicitante']}")
-                    st.write(f"**Métier:** {row['Métier']}")
-                    st.write(f"**Tipo:** {row['Tipo']}")
-                    st.write(f"**Produto Novo ou Backup:** {row['Produto Novo ou Previsto']}")
-                    st.write(f"**Demanda Nova ou Prevista:** {row['Demanda Nova ou Prevista']}")
-                    st.write(f"**Linha de Projeto:** {row['Linha de Projeto']}")
-                    st.write(f"**Tipo de Compra:** {row['Tipo de Compra']}")
-                    # Formatar itens bonitinho
-                    try:
-                        itens_lista = ast.literal_eval(row['Itens'])
-                        if isinstance(itens_lista, list):
-                            st.write("**Itens:**")
-                            for idx, item in enumerate(itens_lista, start=1):
-                                st.markdown(
-                                    f"{idx}. **Descrição:** {item['Descrição']} | "
-                                    f"**Qtd:** {item['Quantidade']} | "
-                                    f"**Unitário:** R$ {item['Valor Unitário']:.2f} | "
-                                   f"**Subtotal:** R$ {item['Subtotal']:,.2f}".replace(",", "v").replace(".", ",").replace("v", ".")
-                                )
-                        else:
-                            st.write(f"**Itens:** {row['Itens']}")
-                    except:
-                        st.write(f"**Itens:** {row['itens']}")
-                    st.write(f"**Valor Total:** R$ {row['Valor Total']:,.2f}".replace(",", "v").replace(".", ",").replace("v", "."))
-                    st.write(f"**Riscos:** {row['Riscos']}")
-                    st.write(f"**Comentários:** {row['Comentários']}")
-                    st.write(f"**Status:** {row['Status']}")
-                    st.markdown(gerar_link_download(row['Caminho Orçamento']), unsafe_allow_html=True)
-                    st.markdown("---")  
-
-        st.subheader("Solicitações Tratadas")
-        if tratadas.empty:
-            st.info("Não há solicitações com status diferente de 'Aprovação Comitê de Compras'.")
-        else:
-            import ast
-            for i, row in tratadas.iterrows():
-                with st.expander(f"Solicitação: {row['Número Solicitação']} — {row['Nome do Solicitante']}"):
-                    st.write(f"**Número Solicitação:** {row['Número Solicitação']}")
-                    st.write(f"**Data Solicitação:** {row['Data Solicitação']}")
-                    st.write(f"**Nome do Solicitante:** {row['Nome do Solicitante']}")
-                    st.write(f"**Métier:** {row['Métier']}")
-                    st.write(f"**Tipo:** {row['Tipo']}")
-                    st.write(f"**Produto Novo ou Backup:** {row['Produto Novo ou Previsto']}")
-                    st.write(f"**Demanda Nova ou Prevista:** {row['Demanda Nova ou Prevista']}")
-                    st.write(f"**Linha de Projeto:** {row['Linha de Projeto']}")
-                    st.write(f"**Tipo de Compra:** {row['Tipo de Compra']}")
-                    try:
-                        itens_lista = ast.literal_eval(row['Itens'])
-                        if isinstance(itens_lista, list):
-                            st.write("**Itens:**")
-                            for idx, item in enumerate(itens_lista, start=1):
-                                st.markdown(
-                                    f"{idx}. **Descrição:** {item['Descrição']} | "
-                                    f"**Qtd:** {item['Quantidade']} | "
-                                    f"**Unitário:** R$ {item['Valor Unitário']:.2f} | "
-                                    f"**Subtotal:** R$ {item['Subtotal']:,.2f}".replace(",", "v").replace(".", ",").replace("v", ".")
-                                )
-                        else:
-                            st.write(f"**Itens:** {row['Itens']}")
-                    except:
-                        st.write(f"**Itens:** {row['Itens']}")
-                    st.write(f"**Valor Total:** R$ {row['Valor Total']:,.2f}".replace(",", "v").replace(".", ",").replace("v", "."))
-                    st.write(f"**Riscos:** {row['Riscos']}")
-                    st.write(f"**Comentários:** {row['Comentários']}")
-                    st.write(f"**Status:** {row['Status']}")
-                    st.markdown(gerar_link_download(row['Caminho Orçamento']), unsafe_allow_html=True)
-                    st.markdown("---")
-                    
-        # Solicitações a serem reapresentadas
-        st.subheader("Solicitações a Serem Reapresentadas")
-        reapresentar = df[df['Status'] == "Reapresentar"]
-
-        if reapresentar.empty:
-            st.info("Não há solicitações marcadas para reapresentação.")
+            with etapa("historico.filtrar"):
+                df = df[df['Número Solicitação'].str.upper() == filtro_numero.upper()]
+
+        busca = st.text_input("Buscar por descrição do item, linha de projeto, comentários ou riscos (opcional)")
+        with etapa("historico.buscar"):
+            encontrados = indice.buscar(busca)
+            if encontrados is not None:
+                df = df[df['Número Solicitação'].str.strip().str.upper().isin(encontrados)]
+
+        # Separar por situação numa única passada
+        grupos = dict(tuple(df.groupby('Situação', sort=False)))
+        secao = st.radio(
+            "Solicitações",
+            list(SECOES_HISTORICO),
+            horizontal=True,
+            format_func=lambda nome: f"{nome} ({len(grupos.get(nome, ()))})"
+        )
+        st.subheader(f"Solicitações {secao}")
+        grupo = grupos.get(secao)
+
+        if grupo is None:
+            st.info(SECOES_HISTORICO[secao])
         else:
-            import ast
-            for i, row in reapresentar.iterrows():
-                with st.expander(f"Solicitação: {row['Número Solicitação']} — {row['Nome do Solicitante']}"):
-                    st.write(f"**Número Solicitação:** {row['Número Solicitação']}")
-                    st.write(f"**Data Solicitação:** {row['Data Solicitação']}")
-                    st.write(f"**Nome do Solicitante:** {row['Nome do Solicitante']}")
-                    st.write(f"**Métier:** {row['Métier']}")
-                    st.write(f"**Tipo:** {row['Tipo']}")
-                    st.write(f"**Produto Novo ou Backup:** {row.get('Produto Novo ou Backup', 'Não informado')}")
-                    st.write(f"**Demanda Nova ou Prevista:** {row['Demanda Nova ou Prevista']}")
-                    st.write(f"**Linha de Projeto:** {row['Linha de Projeto']}")
-                    st.write(f"**Tipo de Compra:** {row['Tipo de Compra']}")
-                    try:
-                        itens_lista = ast.literal_eval(row['Itens'])
-                        if isinstance(itens_lista, list):
-                            st.write("**Itens:**")
-                            for idx, item in enumerate(itens_lista, start=1):
-                                st.markdown(
-                                    f"{idx}. **Descrição:** {item['Descrição']} | "
-                                    f"**Qtd:** {item['Quantidade']} | "
-                                    f"**Unitário:** R$ {item['Valor Unitário']:.2f} | "
-                                    f"**Subtotal:** R$ {item['Subtotal']:,.2f}".replace(",", "v").replace(".", ",").replace("v", ".")
-                                 )
-                        else:
-                            st.write(f"**Itens:** {row['Itens']}")
-                    except:
-                        st.write(f"**Itens:** {row['Itens']}")
-                        st.write(f"**Valor Total:** R$ {row['Valor Total']:,.2f}".replace(",", "v").replace(".", ",").replace("v", "."))
-                        st.write(f"**Riscos:** {row['Riscos']}")
-                        st.write(f"**Comentários:** {row['Comentários']}")
-                        st.write(f"**Status:** {row['Status']}")
-                        st.markdown(gerar_link_download(row['Caminho Orçamento']), unsafe_allow_html=True)
-                        st.markdown("---")
-
-                
-                
+            col1, col2 = st.columns(2)
+            with col1:
+                tamanho_pagina = st.selectbox("Solicitações por página", [10, 25, 50, 100], index=1)
+            total_paginas = max(1, -(-len(grupo) // tamanho_pagina))
+            with col2:
+                pagina = st.selectbox(f"Página (de {total_paginas})", range(1, total_paginas + 1), key=f"pagina_{secao}")
+            trecho = grupo.iloc[(pagina - 1) * tamanho_pagina:pagina * tamanho_pagina]
+
+            with etapa("historico.desenhar_tabela"):
+                st.dataframe(
+                    trecho[['Número Solicitação', 'Data Solicitação', 'Nome do Solicitante', 'Métier', 'Tipo de Compra', 'Valor Total', 'Status']],
+                    width="stretch",
+                    hide_index=True
+                )
+
+            # Só a solicitação escolhida tem o detalhe carregado
+            numero_detalhe = st.selectbox("Ver detalhes da solicitação", [""] + trecho['Número Solicitação'].tolist())
+            if numero_detalhe:
+                row = trecho[trecho['Número Solicitação'] == numero_detalhe].iloc[0]
+                mostrar_detalhe(row, itens_df)
+
         st.subheader("Atualizar Status")
         numero_req_atualizar = st.text_input("Digite o número da solicitação para atualizar status")
-        novo_status = st.selectbox("Novo status", [
-            "Aprovação Comitê de Compras", "Criação da RC", "Aprovação Fabio Silva",
-            "Aprovação Federico Mateos", "Criação Pedido de Compra", "Aguardando Nota fiscal",
-            "Aguardando entrega", "Entregue", "Serviço realizado", "Pago",
-            "Solicitação Recusada", "Cancelado", "Reapresentar"
-        ])
+        novo_status = st.selectbox("Novo status", STATUS_OPCOES)
         if st.button("Atualizar Status"):
-            docs = list(db.collection("requisicoes").where("`Número Solicitação`", "==", numero_req_atualizar).stream())
-            if docs:
-                for doc in docs:
-                    db.collection("requisicoes").document(doc.id).update({"Status": novo_status})
+            if armazenamento.atualizar_status(numero_req_atualizar, novo_status):
                 st.success("Status atualizado com sucesso!")
             else:
                 st.error("Número da solicitação não encontrado.")
 
+        st.subheader("Atualizar Status em Lote")
+        numeros_lote = st.text_area("Números das solicitações (um por linha ou separados por vírgula)")
+        novo_status_lote = st.selectbox("Novo status para o lote", STATUS_OPCOES)
+        if st.button("Atualizar Status em Lote"):
+            numeros = numeros_lote.replace(",", "\n").splitlines()
+            atualizados, nao_encontrados = armazenamento.atualizar_status_em_lote(numeros, novo_status_lote)
+            if atualizados:
+                st.success(f"{atualizados} solicitações movidas para '{novo_status_lote}'.")
+            if nao_encontrados:
+                st.error("Números não encontrados: " + ", ".join(nao_encontrados))
+
         st.subheader("Excluir Solicitação")
         excluir_numero = st.text_input("Digite o número da solicitação para excluir")
         if excluir_numero:
-            docs = list(db.collection("requisicoes").where("`Número Solicitação`", "==", excluir_numero).stream())
-            if docs:
-                for doc in docs:
-                    db.collection("requisicoes").document(doc.id).delete()
+            if armazenamento.excluir_requisicao(excluir_numero):
                 st.success(f"Solicitação {excluir_numero} excluída com sucesso!")
             else:
                 st.error("Número de solicitação não encontrado.")
 
         # Histórico de Solicitações ao Almoxarifado
         st.subheader("Histórico de Solicitações ao Almoxarifado")
-        docs_almox = list(db.collection("almoxarifado").stream())
-        if not docs_almox:
+        pagina_almox = aguardar_leitura(futuro_almox, "almoxarifado", Pagina([], None, False, []))
+        if not pagina_almox.documentos:
             st.info("Nenhuma solicitação de almoxarifado encontrada.")
         else:
-            df_almox = pd.DataFrame([doc.to_dict() for doc in docs_almox])
-            st.dataframe(df_almox, use_container_width=True)
-
+            # Indexado pelo ID do documento, que não muda quando a coleção muda
+            with etapa("historico.desenhar_almox"):
+                df_almox = pd.DataFrame(
+                    pagina_almox.documentos,
+                    index=pd.Index(pagina_almox.ids, name='ID'),
+                    columns=['Data Solicitação', 'Nome do Solicitante', 'MABEC', 'Descrição do Produto', 'Quantidade', 'Pedido']
+                )
+                st.dataframe(df_almox, width="stretch")
+
+        col1, col2, col3 = st.columns([0.2, 0.6, 0.2])
+        with col1:
+            if st.button("⬅️ Anterior", key="almox_anterior", disabled=len(st.session_state.almox_cursores) == 1):
+                st.session_state.almox_cursores.pop()
+                st.rerun()
+        with col2:
+            st.caption(f"Página {len(st.session_state.almox_cursores)} (mais recentes primeiro)")
+        with col3:
+            if st.button("Próxima ➡️", key="almox_proxima", disabled=not pagina_almox.tem_mais):
+                st.session_state.almox_cursores.append(pagina_almox.cursor)
+                st.rerun()
+
+        if pagina_almox.documentos:
             st.subheader("Excluir Solicitação do Almoxarifado")
-            # Mostrar índice + algum dado para facilitar identificação
-            st.dataframe(df_almox[['Nome do Solicitante', 'MABEC', 'Descrição do Produto', 'Quantidade', 'Data Solicitação']], use_container_width=True)
-
-            index_almox = st.number_input(
-                "Digite o índice da solicitação de almoxarifado a excluir",
-                min_value=0,
-                max_value=len(docs_almox) - 1,
-                step=1
+            doc_id = st.selectbox(
+                "Item a excluir (desta página)",
+                pagina_almox.ids,
+                format_func=lambda i: f"{i} — {df_almox.at[i, 'MABEC']} — {df_almox.at[i, 'Descrição do Produto']}"
             )
             if st.button("Excluir Solicitação do Almoxarifado"):
-                doc_id = docs_almox[index_almox].id
-                db.collection("almoxarifado").document(doc_id).delete()
-                st.success(f"Solicitação do almoxarifado de índice {index_almox} excluída com sucesso!")
+                if armazenamento.excluir_almox(doc_id):
+                    st.success(f"Item {doc_id} do almoxarifado excluído com sucesso!")
+                else:
+                    st.warning(f"O item {doc_id} já não existia.")
+
+        st.subheader("Demanda por MABEC")
+        totais_mabec = aguardar_leitura(futuro_mabec, "totais por MABEC", {})
+        if not totais_mabec:
+            st.info("Nenhum MABEC solicitado.")
+        else:
+            with etapa("historico.desenhar_mabec"):
+                df_mabec = (
+                    pd.DataFrame.from_dict(totais_mabec, orient='index', columns=['Quantidade Total', 'Solicitações', 'Última Solicitação'])
+                    .rename_axis('MABEC')
+                    .sort_values('Quantidade Total', ascending=False)
+                )
+                st.dataframe(df_mabec, width="stretch")
+
+        with st.expander("Conferir demanda por MABEC"):
+            st.caption("Reconta todos os itens do almoxarifado e compara com os totais por MABEC.")
+            if st.button("Conferir agora", key="mabec_conferir"):
+                st.session_state.mabec_divergentes = reconciliar_mabec(armazenamento)
+            divergentes_mabec = st.session_state.get('mabec_divergentes')
+            if divergentes_mabec == []:
+                st.success("Os totais por MABEC conferem com os itens do almoxarifado.")
+            elif divergentes_mabec:
+                st.warning(f"{len(divergentes_mabec)} MABEC(s) divergente(s).")
+                st.dataframe(pd.DataFrame(
+                    [
+                        (codigo, (gravado or {}).get('Quantidade Total'), (gravado or {}).get('Solicitações'),
+                         (esperado or {}).get('Quantidade Total'), (esperado or {}).get('Solicitações'))
+                        for codigo, gravado, esperado in divergentes_mabec
+                    ],
+                    columns=['MABEC', 'Quantidade Gravada', 'Solicitações Gravadas', 'Quantidade Correta', 'Solicitações Corretas']
+                ), width="stretch", hide_index=True)
+                if st.button("Corrigir totais por MABEC"):
+                    reconciliar_mabec(armazenamento, corrigir=True)
+                    st.session_state.mabec_divergentes = None
+                    st.rerun()
+
+    elif senha != "":
+        st.error("Senha incorreta.")
+
+# ---- ABA PAINEL ----
+elif aba == "Painel de Compras":
+    st.title("Painel de Compras")
+    senha = st.text_input("Digite a senha de administrador", type="password")
+
+    if senha == "admin123":
+        import pandas as pd
+
+        armazenamento = obter_armazenamento()
+        # Só os totais por grupo, mantidos em memória pelo listener: o custo não
+        # depende do tamanho da coleção nem do número de reruns
+        totais = ler_grupos()
+        with etapa("painel.montar_dataframe"):
+            painel = pd.DataFrame(
+                [(*chave, quantidade, valor) for chave, (quantidade, valor) in totais.items() if quantidade],
+                columns=[*CAMPOS_PAINEL, 'Quantidade', 'Valor']
+            )
+            painel[list(CAMPOS_PAINEL)] = painel[list(CAMPOS_PAINEL)].replace("", "(não informado)")
+
+        if painel.empty:
+            st.info("Nenhuma solicitação registrada.")
+        else:
+            col1, col2, col3, col4 = st.columns(4)
+            presentes = [s for s in STATUS_OPCOES if s in set(painel['Status'])]
+            filtros = {
+                'Status': col1.multiselect("Status", presentes + sorted(set(painel['Status']) - set(presentes))),
+                'Métier': col2.multiselect("Métier", sorted(painel['Métier'].unique())),
+                'Tipo de Compra': col3.multiselect("Tipo de Compra", sorted(painel['Tipo de Compra'].unique())),
+                'Mês': col4.multiselect("Mês", sorted(painel['Mês'].unique(), reverse=True)),
+            }
+            for campo, escolhidos in filtros.items():
+                if escolhidos:
+                    painel = painel[painel[campo].isin(escolhidos)]
+
+            agrupar = st.radio("Agrupar por", ['Métier', 'Tipo de Compra', 'Mês', 'Status'], horizontal=True)
+            col1, col2 = st.columns(2)
+            col1.metric("Solicitações", int(painel['Quantidade'].sum()))
+            col2.metric("Valor total", f"R$ {formatar_reais(painel['Valor'].sum())}")
+
+            with etapa("painel.desenhar"):
+                resumo = painel.groupby(agrupar)[['Quantidade', 'Valor']].sum()
+                if agrupar != 'Mês':
+                    resumo = resumo.sort_values('Valor', ascending=False)
+                st.dataframe(resumo.style.format({'Valor': formatar_reais}), width="stretch")
+                st.bar_chart(resumo['Valor'])
+
+        with st.expander("Conferir totais"):
+            st.caption("Reconta todas as solicitações e compara com os totais do painel.")
+            if st.button("Conferir agora"):
+                st.session_state.painel_divergentes = reconciliar(armazenamento)
+            divergentes = st.session_state.get('painel_divergentes')
+            if divergentes == []:
+                st.success("Os totais do painel conferem com as solicitações.")
+            elif divergentes:
+                st.warning(f"{len(divergentes)} grupo(s) divergente(s).")
+                st.dataframe(pd.DataFrame(
+                    [(*chave, *gravado, *esperado) for chave, gravado, esperado in divergentes],
+                    columns=[*CAMPOS_PAINEL, 'Quantidade Gravada', 'Valor Gravado', 'Quantidade Correta', 'Valor Correto']
+                ), width="stretch")
+                if st.button("Corrigir totais"):
+                    reconciliar(armazenamento, corrigir=True)
+                    st.session_state.painel_divergentes = None
+                    st.rerun()
 
     elif senha != "":
-        st.error("Senha incorreta.")             
+        st.error("Senha incorreta.")
+
+relatorio_inicializacao.registrar_rerun(aba, _sobrecarga_rerun, time.perf_counter() - _inicio_execucao)
+registro_rerun = medicao.encerrar(aba)
+if st.query_params.get("debug") == "1":
+    with st.sidebar.expander("Desempenho"):
+        st.json(relatorio_inicializacao.resumo())
+        st.caption("Último rerun: etapas, documentos lidos e gravados por coleção e elementos enviados")
+        st.json(registro_rerun)
@@ -0,0 +1,126 @@
+"""Interface de armazenamento das coleções 'requisicoes' e 'almoxarifado'.
+
+A implementação é escolhida pela variável de ambiente REQUIS_BACKEND:
+``firestore`` (padrão) ou ``sqlite``; o arquivo do SQLite vem de
+REQUIS_SQLITE (padrão ``requisicoes.db``).
+"""
+import os
+import uuid
+from collections import namedtuple
+from datetime import datetime
+
+COLECOES = ("requisicoes", "almoxarifado")
+
+# Totais do painel e da demanda por MABEC (ver agregados.py); mantidos pelos próprios backends.
+# Também podem ser listados e escutados, com documentos no formato gravado pelo Firestore
+COLECAO_AGREGADOS = "agregados"
+COLECAO_MABEC = "totais_mabec"
+
+# ``ids`` acompanha ``documentos``, na mesma ordem
+Pagina = namedtuple("Pagina", ["documentos", "cursor", "tem_mais", "ids"], defaults=[None])
+
+
+class ErroArmazenamento(Exception):
+    """Falha do backend ao ler ou gravar; a mensagem vem do erro original."""
+
+
+class RequisicaoExistente(ErroArmazenamento):
+    """salvar_requisicao encontrou outra requisição com o mesmo número."""
+
+
+class Armazenamento:
+    """Operações usadas pelo app. Cada backend implementa todas elas.
+
+    Cursores de paginação são opacos: só o backend que os gerou sabe usá-los.
+    """
+
+    # ---- requisicoes ----
+    def obter_requisicao(self, numero):
+        raise NotImplementedError
+
+    def salvar_requisicao(self, dados):
+        """Cria a requisição; levanta RequisicaoExistente se o número já existir."""
+        raise NotImplementedError
+
+    def salvar_requisicoes(self, lista):
+        """Cria várias requisições de uma vez; se alguma já existir, levanta
+        RequisicaoExistente (no Firestore o lote que a contém não é gravado)."""
+        raise NotImplementedError
+
+    def atualizar_status(self, numero, status):
+        raise NotImplementedError
+
+    def atualizar_status_em_lote(self, numeros, status):
+        raise NotImplementedError
+
+    def excluir_requisicao(self, numero):
+        raise NotImplementedError
+
+    def pagina_por_nome(self, prefixo, tamanho=20, cursor=None):
+        raise NotImplementedError
+
+    def pagina_recentes(self, tamanho=20, cursor=None, colecao="requisicoes"):
+        raise NotImplementedError
+
+    def pagina_por_data(self, colecao, tamanho=500, cursor=None, inicio=None, fim=None, status=None):
+        """Página de qualquer coleção em ordem crescente de 'Data Solicitação'.
+
+        ``inicio`` é incluso e ``fim`` excluso (textos comparados ao campo);
+        ``status`` é uma lista e só se aplica a 'requisicoes'. Documentos sem
+        data ficam de fora, como numa consulta ordenada do Firestore.
+        """
+        raise NotImplementedError
+
+    # ---- almoxarifado ----
+    def enviar_pedido_almox(self, itens):
+        """Grava todos os itens ou nenhum, somando-os aos totais por MABEC."""
+        raise NotImplementedError
+
+    def excluir_almox(self, doc_id):
+        """Apaga o item pelo ID do documento; retorna False se ele não existia."""
+        raise NotImplementedError
+
+    def totais_mabec(self):
+        """{MABEC: {'Quantidade Total', 'Solicitações', 'Última Solicitação'}}."""
+        raise NotImplementedError
+
+    def corrigir_totais_mabec(self, totais):
+        """Substitui todos os totais por MABEC pelos informados (ver agregados.somar_mabec)."""
+        raise NotImplementedError
+
+    # ---- agregados do painel ----
+    def agregados(self):
+        """Totais por grupo, como {(status, métier, tipo de compra, mês): [quantidade, valor]}."""
+        raise NotImplementedError
+
+    def corrigir_agregados(self, totais):
+        """Regrava os grupos informados com os totais absolutos dados."""
+        raise NotImplementedError
+
+    # ---- leitura de coleções inteiras ----
+    def listar(self, colecao):
+        """Todos os documentos da coleção, como {id: dados}."""
+        raise NotImplementedError
+
+    def escutar(self, colecao, callback):
+        """Chama callback(mudancas) com a carga inicial e depois a cada alteração.
+
+        ``mudancas`` é uma lista de (id, dados); dados None indica remoção.
+        Retorna um objeto com ``unsubscribe()``.
+        """
+        raise NotImplementedError
+
+
+def gerar_id_pedido():
+    return f"ALM-{datetime.now().strftime('%Y%m%d%H%M%S')}-{uuid.uuid4().hex[:6].upper()}"
+
+
+def criar_armazenamento(tipo=None, conectar_firestore=None):
+    tipo = (tipo or os.environ.get("REQUIS_BACKEND") or "firestore").lower()
+    if tipo == "sqlite":
+        from armazenamento_sqlite import ArmazenamentoSQLite
+        return ArmazenamentoSQLite(os.environ.get("REQUIS_SQLITE", "requisicoes.db"))
+    if tipo == "firestore":
+        from armazenamento_firestore import ArmazenamentoFirestore
+        return ArmazenamentoFirestore(conectar_firestore())
+    raise ValueError(f"Backend de armazenamento desconhecido: {tipo}")
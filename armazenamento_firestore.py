@@ -0,0 +1,97 @@
+from functools import wraps
+
+from google.api_core.exceptions import AlreadyExists, GoogleAPICallError
+
+import consultas
+import gravacao
+from armazenamento import Armazenamento, ErroArmazenamento, RequisicaoExistente
+
+
+def _traduzir_erros(metodo):
+    @wraps(metodo)
+    def envolvido(*args, **kwargs):
+        try:
+            return metodo(*args, **kwargs)
+        except AlreadyExists as erro:
+            raise RequisicaoExistente(str(erro)) from erro
+        except GoogleAPICallError as erro:
+            raise ErroArmazenamento(str(erro)) from erro
+    return envolvido
+
+
+class ArmazenamentoFirestore(Armazenamento):
+
+    def __init__(self, db):
+        self.db = db
+
+    @_traduzir_erros
+    def obter_requisicao(self, numero):
+        return consultas.buscar_por_numero(self.db.collection("requisicoes"), numero)
+
+    @_traduzir_erros
+    def salvar_requisicao(self, dados):
+        gravacao.salvar_requisicao(self.db, dados)
+
+    @_traduzir_erros
+    def salvar_requisicoes(self, lista):
+        gravacao.salvar_requisicoes(self.db, lista)
+
+    @_traduzir_erros
+    def atualizar_status(self, numero, status):
+        return gravacao.atualizar_status(self.db, numero, status)
+
+    @_traduzir_erros
+    def atualizar_status_em_lote(self, numeros, status):
+        return gravacao.atualizar_status_em_lote(self.db, numeros, status)
+
+    @_traduzir_erros
+    def excluir_requisicao(self, numero):
+        return gravacao.excluir_requisicao(self.db, numero)
+
+    @_traduzir_erros
+    def pagina_por_nome(self, prefixo, tamanho=20, cursor=None):
+        return consultas.pagina_por_nome(self.db.collection("requisicoes"), prefixo, tamanho, cursor)
+
+    @_traduzir_erros
+    def pagina_recentes(self, tamanho=20, cursor=None, colecao="requisicoes"):
+        return consultas.pagina_recentes(self.db.collection(colecao), tamanho, cursor)
+
+    @_traduzir_erros
+    def pagina_por_data(self, colecao, tamanho=500, cursor=None, inicio=None, fim=None, status=None):
+        return consultas.pagina_por_data(self.db.collection(colecao), tamanho, cursor, inicio, fim, status)
+
+    @_traduzir_erros
+    def enviar_pedido_almox(self, itens):
+        return gravacao.enviar_pedido_almox(self.db, itens)
+
+    @_traduzir_erros
+    def excluir_almox(self, doc_id):
+        return gravacao.excluir_almox(self.db, doc_id)
+
+    @_traduzir_erros
+    def totais_mabec(self):
+        return gravacao.ler_totais_mabec(self.db)
+
+    @_traduzir_erros
+    def corrigir_totais_mabec(self, totais):
+        gravacao.corrigir_totais_mabec(self.db, totais)
+
+    @_traduzir_erros
+    def agregados(self):
+        return gravacao.ler_agregados(self.db)
+
+    @_traduzir_erros
+    def corrigir_agregados(self, totais):
+        gravacao.corrigir_agregados(self.db, totais)
+
+    @_traduzir_erros
+    def listar(self, colecao):
+        return {doc.id: doc.to_dict() for doc in self.db.collection(colecao).stream()}
+
+    def escutar(self, colecao, callback):
+        def ao_receber(snapshot, mudancas, read_time):
+            callback([
+                (m.document.id, None if m.type.name == "REMOVED" else m.document.to_dict())
+                for m in mudancas
+            ])
+        return self.db.collection(colecao).on_snapshot(ao_receber)
@@ -0,0 +1,491 @@
+import json
+import sqlite3
+import threading
+import time
+
+from agregados import (
+    CAMPOS, mabec, precisa_reler_ultima, sem_efeito, somar, somar_mabec, total_mabec, variacao, variacao_mabec
+)
+from armazenamento import (
+    COLECAO_AGREGADOS, COLECAO_MABEC, Armazenamento, ErroArmazenamento, Pagina, RequisicaoExistente, gerar_id_pedido
+)
+from consultas import FIM_PREFIXO, normalizar
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS requisicoes (
+    numero TEXT PRIMARY KEY,
+    nome_busca TEXT NOT NULL DEFAULT '',
+    status TEXT,
+    data TEXT,
+    dados TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_requisicoes_status ON requisicoes (status);
+CREATE INDEX IF NOT EXISTS idx_requisicoes_nome ON requisicoes (nome_busca, numero);
+CREATE INDEX IF NOT EXISTS idx_requisicoes_data ON requisicoes (data, numero);
+
+CREATE TABLE IF NOT EXISTS almoxarifado (
+    id TEXT PRIMARY KEY,
+    pedido TEXT,
+    mabec TEXT,
+    data TEXT,
+    dados TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_almoxarifado_data ON almoxarifado (data, id);
+CREATE INDEX IF NOT EXISTS idx_almoxarifado_pedido ON almoxarifado (pedido);
+CREATE INDEX IF NOT EXISTS idx_almoxarifado_mabec ON almoxarifado (mabec, data);
+
+-- Demanda por MABEC (ver agregados.py), ajustada junto com cada item gravado ou apagado
+CREATE TABLE IF NOT EXISTS totais_mabec (
+    mabec TEXT PRIMARY KEY,
+    quantidade INTEGER NOT NULL,
+    solicitacoes INTEGER NOT NULL,
+    ultima TEXT NOT NULL
+);
+
+-- Totais do painel por grupo (ver agregados.py), ajustados junto com cada gravação
+CREATE TABLE IF NOT EXISTS agregados (
+    status TEXT NOT NULL,
+    metier TEXT NOT NULL,
+    tipo_compra TEXT NOT NULL,
+    mes TEXT NOT NULL,
+    quantidade INTEGER NOT NULL,
+    valor REAL NOT NULL,
+    PRIMARY KEY (status, metier, tipo_compra, mes)
+);
+
+-- Registro de alterações lido pelos observadores (equivalente ao listener do Firestore)
+CREATE TABLE IF NOT EXISTS alteracoes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    colecao TEXT NOT NULL,
+    doc_id TEXT NOT NULL
+);
+"""
+
+# Tabela e coluna-chave de cada coleção
+_TABELAS = {
+    "requisicoes": "numero",
+    "almoxarifado": "id",
+}
+
+# Os totais também podem ser escutados; o ID é a chave natural (o grupo em JSON, ou o MABEC)
+_SQL_TOTAIS = {
+    COLECAO_AGREGADOS: (
+        "SELECT status, metier, tipo_compra, mes, quantidade, valor FROM agregados",
+        " WHERE status = ? AND metier = ? AND tipo_compra = ? AND mes = ?",
+    ),
+    COLECAO_MABEC: ("SELECT mabec, quantidade, solicitacoes, ultima FROM totais_mabec", " WHERE mabec = ?"),
+}
+
+# Quantas alterações manter no registro; observadores leem a cada segundo
+_ALTERACOES_MANTIDAS = 100_000
+
+_CAMPOS_TOTAL_MABEC = ("Quantidade Total", "Solicitações", "Última Solicitação")
+
+# Limite de parâmetros por consulta em versões antigas do SQLite
+_LIMITE_PARAMETROS = 900
+
+
+def _numero(numero):
+    return str(numero).strip().upper()
+
+
+def _id_grupo(chave):
+    return json.dumps(list(chave), ensure_ascii=False)
+
+
+def _documento_total(colecao, linha):
+    # (id, dados) no mesmo formato dos documentos gravados pelo Firestore
+    if colecao == COLECAO_AGREGADOS:
+        return _id_grupo(linha[:4]), {**dict(zip(CAMPOS, linha[:4])), "Quantidade": linha[4], "Valor": linha[5]}
+    return linha[0], {"MABEC": linha[0], **dict(zip(_CAMPOS_TOTAL_MABEC, linha[1:]))}
+
+
+class _Observador(threading.Thread):
+
+    def __init__(self, banco, colecao, callback, intervalo):
+        super().__init__(daemon=True, name=f"observador-{colecao}")
+        self._banco = banco
+        self._colecao = colecao
+        self._callback = callback
+        self._intervalo = intervalo
+        self._parar = threading.Event()
+
+    def run(self):
+        # Lê a posição do registro antes da carga: alterações no meio são reentregues
+        ultimo = self._banco._ultima_alteracao()
+        self._callback(list(self._banco.listar(self._colecao).items()))
+        while not self._parar.wait(self._intervalo):
+            try:
+                ultimo = self._banco._entregar_alteracoes(self._colecao, ultimo, self._callback)
+            except sqlite3.Error:
+                continue
+
+    def unsubscribe(self):
+        self._parar.set()
+
+
+class ArmazenamentoSQLite(Armazenamento):
+    """Backend local em SQLite (modo WAL), com índices por número, status, nome e data.
+
+    Cada documento é guardado como JSON na coluna ``dados``; as colunas
+    indexadas são cópias dos campos usados nas consultas.
+    """
+
+    def __init__(self, caminho, intervalo_observador=1.0):
+        self.caminho = caminho
+        self.intervalo_observador = intervalo_observador
+        self._local = threading.local()
+        conexao = self._conexao()
+        tabelas = {nome for nome, in conexao.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        conexao.executescript(ESQUEMA)
+        # Banco anterior aos totais: calcula-os uma vez a partir dos documentos
+        if "agregados" not in tabelas:
+            self.corrigir_agregados(somar(self.listar("requisicoes").values()))
+        if "totais_mabec" not in tabelas:
+            self.corrigir_totais_mabec(somar_mabec(self.listar("almoxarifado")))
+
+    def _conexao(self):
+        # Uma conexão por thread: o Streamlit roda cada sessão numa thread própria
+        conexao = getattr(self._local, "conexao", None)
+        if conexao is None:
+            # Sem transações implícitas: _executar abre cada uma com BEGIN IMMEDIATE
+            conexao = sqlite3.connect(self.caminho, timeout=30, isolation_level=None)
+            conexao.execute("PRAGMA journal_mode=WAL")
+            conexao.execute("PRAGMA synchronous=NORMAL")
+            self._local.conexao = conexao
+        return conexao
+
+    def _executar(self, funcao):
+        """Roda funcao(conexao) numa transação de escrita, traduzindo erros do SQLite.
+
+        BEGIN IMMEDIATE pega a trava de escrita antes da primeira leitura: o
+        documento anterior lido para ajustar os totais não muda até o COMMIT,
+        como numa transação do Firestore.
+        """
+        conexao = self._conexao()
+        try:
+            conexao.execute("BEGIN IMMEDIATE")
+            try:
+                resultado = funcao(conexao)
+            except BaseException:
+                if conexao.in_transaction:
+                    conexao.execute("ROLLBACK")
+                raise
+            conexao.execute("COMMIT")
+            return resultado
+        except sqlite3.Error as erro:
+            raise ErroArmazenamento(str(erro)) from erro
+
+    def _consultar(self, funcao):
+        # Só leitura: cada SELECT já vê um estado consistente, sem travar os escritores
+        try:
+            return funcao(self._conexao())
+        except sqlite3.Error as erro:
+            raise ErroArmazenamento(str(erro)) from erro
+
+    def _registrar(self, conexao, colecao, ids):
+        cursor = conexao.executemany(
+            "INSERT INTO alteracoes (colecao, doc_id) VALUES (?, ?)",
+            [(colecao, doc_id) for doc_id in ids]
+        )
+        ultimo = conexao.execute("SELECT MAX(id) FROM alteracoes").fetchone()[0] or 0
+        if ultimo % 1000 < cursor.rowcount:
+            conexao.execute("DELETE FROM alteracoes WHERE id <= ?", (ultimo - _ALTERACOES_MANTIDAS,))
+
+    def _ultima_alteracao(self):
+        return self._conexao().execute("SELECT COALESCE(MAX(id), 0) FROM alteracoes").fetchone()[0]
+
+    def _ler_totais(self, conexao, colecao, ids=None):
+        sql, filtro = _SQL_TOTAIS[colecao]
+        if ids is None:
+            linhas = conexao.execute(sql).fetchall()
+        else:
+            parametros = [json.loads(doc_id) if colecao == COLECAO_AGREGADOS else [doc_id] for doc_id in ids]
+            linhas = [linha for valores in parametros for linha in conexao.execute(sql + filtro, valores)]
+        return dict(_documento_total(colecao, linha) for linha in linhas)
+
+    def _buscar(self, conexao, colecao, ids):
+        if colecao in _SQL_TOTAIS:
+            return self._ler_totais(conexao, colecao, ids)
+        chave = _TABELAS[colecao]
+        encontrados = {}
+        for inicio in range(0, len(ids), _LIMITE_PARAMETROS):
+            parte = ids[inicio:inicio + _LIMITE_PARAMETROS]
+            marcadores = ", ".join("?" * len(parte))
+            for doc_id, dados in conexao.execute(
+                f"SELECT {chave}, dados FROM {colecao} WHERE {chave} IN ({marcadores})", parte
+            ):
+                encontrados[doc_id] = json.loads(dados)
+        return encontrados
+
+    def _entregar_alteracoes(self, colecao, ultimo, callback):
+        conexao = self._conexao()
+        linhas = conexao.execute(
+            "SELECT id, doc_id FROM alteracoes WHERE colecao = ? AND id > ? ORDER BY id",
+            (colecao, ultimo)
+        ).fetchall()
+        if not linhas:
+            return ultimo
+        ids = list(dict.fromkeys(doc_id for _, doc_id in linhas))
+        encontrados = self._buscar(conexao, colecao, ids)
+        callback([(doc_id, encontrados.get(doc_id)) for doc_id in ids])
+        return linhas[-1][0]
+
+    def _ajustar_agregados(self, conexao, ajuste):
+        ajuste = sem_efeito(ajuste)
+        conexao.executemany(
+            "INSERT INTO agregados (status, metier, tipo_compra, mes, quantidade, valor) VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT (status, metier, tipo_compra, mes) DO UPDATE SET"
+            " quantidade = quantidade + excluded.quantidade, valor = valor + excluded.valor",
+            [(*chave, quantidade, valor) for chave, (quantidade, valor) in ajuste.items()]
+        )
+        if ajuste:
+            self._registrar(conexao, COLECAO_AGREGADOS, [_id_grupo(chave) for chave in ajuste])
+
+    # ---- requisicoes ----
+    def _gravar_requisicao(self, conexao, dados, substituir=True, anterior=None):
+        numero = _numero(dados['Número Solicitação'])
+        if substituir and anterior is None:
+            anterior = self._buscar(conexao, "requisicoes", [numero]).get(numero)
+        self._ajustar_agregados(conexao, variacao(anterior, dados))
+        conexao.execute(
+            f"INSERT {'OR REPLACE ' if substituir else ''}INTO requisicoes"
+            " (numero, nome_busca, status, data, dados) VALUES (?, ?, ?, ?, ?)",
+            (
+                numero,
+                normalizar(dados.get('Nome do Solicitante')),
+                dados.get('Status'),
+                dados.get('Data Solicitação') or '',
+                json.dumps(dados, ensure_ascii=False),
+            )
+        )
+        return numero
+
+    def obter_requisicao(self, numero):
+        encontrados = self._consultar(lambda c: self._buscar(c, "requisicoes", [_numero(numero)]))
+        return encontrados.get(_numero(numero))
+
+    def salvar_requisicao(self, dados):
+        def salvar(conexao):
+            try:
+                numero = self._gravar_requisicao(conexao, dados, substituir=False)
+            except sqlite3.IntegrityError as erro:
+                raise RequisicaoExistente(str(erro)) from erro
+            self._registrar(conexao, "requisicoes", [numero])
+        self._executar(salvar)
+
+    def salvar_requisicoes(self, lista):
+        def salvar(conexao):
+            try:
+                numeros = [self._gravar_requisicao(conexao, dados, substituir=False) for dados in lista]
+            except sqlite3.IntegrityError as erro:
+                raise RequisicaoExistente(str(erro)) from erro
+            self._registrar(conexao, "requisicoes", numeros)
+        self._executar(salvar)
+
+    def atualizar_status(self, numero, status):
+        atualizados, _ = self.atualizar_status_em_lote([numero], status)
+        return atualizados == 1
+
+    def atualizar_status_em_lote(self, numeros, status):
+        numeros = list(dict.fromkeys(_numero(n) for n in numeros if str(n).strip()))
+
+        def atualizar(conexao):
+            encontrados = self._buscar(conexao, "requisicoes", numeros)
+            for dados in encontrados.values():
+                anterior = dict(dados)
+                dados['Status'] = status
+                self._gravar_requisicao(conexao, dados, anterior=anterior)
+            self._registrar(conexao, "requisicoes", list(encontrados))
+            return encontrados
+
+        encontrados = self._executar(atualizar)
+        return len(encontrados), [n for n in numeros if n not in encontrados]
+
+    def excluir_requisicao(self, numero):
+        def excluir(conexao):
+            anterior = self._buscar(conexao, "requisicoes", [_numero(numero)]).get(_numero(numero))
+            if anterior is None:
+                return False
+            conexao.execute("DELETE FROM requisicoes WHERE numero = ?", (_numero(numero),))
+            self._ajustar_agregados(conexao, variacao(antes=anterior))
+            self._registrar(conexao, "requisicoes", [_numero(numero)])
+            return True
+        return self._executar(excluir)
+
+    def _pagina(self, sql, parametros, tamanho):
+        # Um registro a mais só para saber se existe próxima página
+        linhas = self._consultar(lambda c: c.execute(sql, (*parametros, tamanho + 1)).fetchall())
+        tem_mais = len(linhas) > tamanho
+        linhas = linhas[:tamanho]
+        return Pagina(
+            documentos=[json.loads(dados) for *_, dados in linhas],
+            cursor=tuple(linhas[-1][:2]) if linhas else None,
+            tem_mais=tem_mais,
+            ids=[linha[1] for linha in linhas],
+        )
+
+    def pagina_por_nome(self, prefixo, tamanho=20, cursor=None):
+        prefixo = normalizar(prefixo)
+        depois = cursor or ("", "")
+        return self._pagina(
+            "SELECT nome_busca, numero, dados FROM requisicoes"
+            " WHERE nome_busca >= ? AND nome_busca < ? AND (nome_busca, numero) > (?, ?)"
+            " ORDER BY nome_busca, numero LIMIT ?",
+            (prefixo, prefixo + FIM_PREFIXO, *depois),
+            tamanho
+        )
+
+    def pagina_recentes(self, tamanho=20, cursor=None, colecao="requisicoes"):
+        chave = _TABELAS[colecao]
+        if cursor is None:
+            return self._pagina(
+                f"SELECT data, {chave}, dados FROM {colecao} WHERE data IS NOT NULL"
+                f" ORDER BY data DESC, {chave} DESC LIMIT ?",
+                (),
+                tamanho
+            )
+        return self._pagina(
+            f"SELECT data, {chave}, dados FROM {colecao} WHERE (data, {chave}) < (?, ?)"
+            f" ORDER BY data DESC, {chave} DESC LIMIT ?",
+            cursor,
+            tamanho
+        )
+
+    def pagina_por_data(self, colecao, tamanho=500, cursor=None, inicio=None, fim=None, status=None):
+        chave = _TABELAS[colecao]
+        condicoes, parametros = ["data IS NOT NULL"], []
+        if cursor is not None:
+            condicoes.append(f"(data, {chave}) > (?, ?)")
+            parametros += cursor
+        if inicio:
+            condicoes.append("data >= ?")
+            parametros.append(inicio)
+        if fim:
+            condicoes.append("data < ?")
+            parametros.append(fim)
+        if status and colecao == "requisicoes":
+            condicoes.append(f"status IN ({', '.join('?' * len(status))})")
+            parametros += status
+        return self._pagina(
+            f"SELECT data, {chave}, dados FROM {colecao} WHERE {' AND '.join(condicoes)}"
+            f" ORDER BY data, {chave} LIMIT ?",
+            parametros,
+            tamanho
+        )
+
+    # ---- almoxarifado ----
+    def _gravar_almox(self, conexao, gravar=(), apagar=()):
+        # Itens e totais por MABEC na mesma transação; retorna os IDs apagados de fato
+        existentes = self._buscar(conexao, "almoxarifado", [doc_id for doc_id, _ in gravar] + list(apagar))
+        mudancas = {}
+        for doc_id, dados in gravar:
+            variacao_mabec(doc_id, existentes.get(doc_id), dados, mudancas)
+        for doc_id in apagar:
+            variacao_mabec(doc_id, existentes.get(doc_id), None, mudancas)
+
+        conexao.executemany(
+            "INSERT OR REPLACE INTO almoxarifado (id, pedido, mabec, data, dados) VALUES (?, ?, ?, ?, ?)",
+            [
+                (doc_id, dados.get("Pedido"), mabec(dados), dados.get("Data Solicitação"),
+                 json.dumps(dados, ensure_ascii=False))
+                for doc_id, dados in gravar
+            ]
+        )
+        apagados = [doc_id for doc_id in apagar if doc_id in existentes]
+        conexao.executemany("DELETE FROM almoxarifado WHERE id = ?", [(doc_id,) for doc_id in apagados])
+
+        for codigo, mudanca in mudancas.items():
+            linha = conexao.execute(
+                "SELECT quantidade, solicitacoes, ultima FROM totais_mabec WHERE mabec = ?", (codigo,)
+            ).fetchone()
+            atual = dict(zip(_CAMPOS_TOTAL_MABEC, linha)) if linha else None
+            restante = None
+            if precisa_reler_ultima(atual, mudanca):
+                # Os itens já foram gravados e apagados acima; o índice (mabec, data) responde direto
+                restante = conexao.execute("SELECT MAX(data) FROM almoxarifado WHERE mabec = ?", (codigo,)).fetchone()[0]
+            total = total_mabec(atual, mudanca, restante)
+            if total is None:
+                conexao.execute("DELETE FROM totais_mabec WHERE mabec = ?", (codigo,))
+            else:
+                conexao.execute(
+                    "INSERT OR REPLACE INTO totais_mabec VALUES (?, ?, ?, ?)",
+                    (codigo, *(total[campo] for campo in _CAMPOS_TOTAL_MABEC))
+                )
+
+        self._registrar(conexao, "almoxarifado", [doc_id for doc_id, _ in gravar] + apagados)
+        if mudancas:
+            self._registrar(conexao, COLECAO_MABEC, list(mudancas))
+        return apagados
+
+    def enviar_pedido_almox(self, itens):
+        # Uma única transação: o pedido inteiro entra ou nada entra
+        pedido = gerar_id_pedido()
+        gravar = [
+            (f"{pedido}-{n:03d}", dict(item, **{"Pedido": pedido, "Item do Pedido": n}))
+            for n, item in enumerate(itens, start=1)
+        ]
+        t0 = time.perf_counter()
+        self._executar(lambda conexao: self._gravar_almox(conexao, gravar=gravar))
+        return pedido, [{"itens": len(gravar), "ms": (time.perf_counter() - t0) * 1000, "tentativas": 1}]
+
+    def excluir_almox(self, doc_id):
+        return bool(self._executar(lambda conexao: self._gravar_almox(conexao, apagar=[doc_id])))
+
+    def totais_mabec(self):
+        linhas = self._consultar(lambda c: c.execute(
+            "SELECT mabec, quantidade, solicitacoes, ultima FROM totais_mabec"
+        ).fetchall())
+        return {linha[0]: dict(zip(_CAMPOS_TOTAL_MABEC, linha[1:])) for linha in linhas}
+
+    def corrigir_totais_mabec(self, totais):
+        def gravar(conexao):
+            anteriores = [codigo for codigo, in conexao.execute("SELECT mabec FROM totais_mabec")]
+            conexao.execute("DELETE FROM totais_mabec")
+            conexao.executemany(
+                "INSERT INTO totais_mabec VALUES (?, ?, ?, ?)",
+                [(codigo, *(total[campo] for campo in _CAMPOS_TOTAL_MABEC)) for codigo, total in totais.items()]
+            )
+            self._registrar(conexao, COLECAO_MABEC, list(dict.fromkeys(anteriores + list(totais))))
+        self._executar(gravar)
+
+    # ---- agregados do painel ----
+    def agregados(self):
+        linhas = self._consultar(lambda c: c.execute(
+            "SELECT status, metier, tipo_compra, mes, quantidade, valor FROM agregados"
+        ).fetchall())
+        return {tuple(linha[:4]): [linha[4], linha[5]] for linha in linhas}
+
+    def corrigir_agregados(self, totais):
+        def gravar(conexao):
+            for chave, (quantidade, valor) in totais.items():
+                conexao.execute(
+                    "DELETE FROM agregados WHERE status = ? AND metier = ? AND tipo_compra = ? AND mes = ?", chave
+                )
+                if quantidade:
+                    conexao.execute("INSERT INTO agregados VALUES (?, ?, ?, ?, ?, ?)", (*chave, quantidade, valor))
+            self._registrar(conexao, COLECAO_AGREGADOS, [_id_grupo(chave) for chave in totais])
+        self._executar(gravar)
+
+    # ---- leitura de coleções inteiras ----
+    def listar(self, colecao):
+        if colecao in _SQL_TOTAIS:
+            return self._consultar(lambda c: self._ler_totais(c, colecao))
+        chave = _TABELAS[colecao]
+        linhas = self._consultar(lambda c: c.execute(f"SELECT {chave}, dados FROM {colecao}").fetchall())
+        return {doc_id: json.loads(dados) for doc_id, dados in linhas}
+
+    def escutar(self, colecao, callback):
+        observador = _Observador(self, colecao, callback, self.intervalo_observador)
+        observador.start()
+        return observador
+
+    def importar(self, colecao, documentos):
+        """Carga em massa de {id: dados}, por exemplo a partir de uma cópia do Firestore."""
+        def gravar(conexao):
+            if colecao == "requisicoes":
+                ids = [self._gravar_requisicao(conexao, dados) for dados in documentos.values()]
+                self._registrar(conexao, colecao, ids)
+            else:
+                self._gravar_almox(conexao, gravar=list(documentos.items()))
+        self._executar(gravar)
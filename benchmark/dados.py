@@ -0,0 +1,108 @@
+"""Requisições e itens de almoxarifado sintéticos, no formato gravado pelo app."""
+import random
+from datetime import datetime, timedelta
+
+from agregados import CAMPOS, id_grupo, somar, somar_mabec
+from consultas import normalizar
+
+STATUS = [
+    "Aprovação Comitê de Compras", "Criação da RC", "Criação Pedido de Compra",
+    "Aguardando entrega", "Entregue", "Pago", "Cancelado", "Reapresentar",
+]
+METIERS = ["Manutenção", "Qualidade", "Logística", "Engenharia", "Segurança", "TI"]
+TIPOS_COMPRA = [
+    "Ordinária (papelaria, limpeza, etc.)",
+    "Emergenciais (situações imprevistas)",
+    "Projetos (itens específicos para ações pontuais)",
+    "Serviços (transporte, manutenção, calibração, etc.)",
+]
+NOMES = ["Ana", "Bruno", "Carla", "Diego", "Érica", "Fábio", "Gisele", "Hugo", "Íris", "João"]
+SOBRENOMES = ["Silva", "Souza", "Oliveira", "Pereira", "Lima", "Gonçalves", "Araújo", "Ribeiro"]
+PALAVRAS = [
+    "parafuso", "porca", "arruela", "cabo", "fusível", "motor", "sensor", "válvula", "correia",
+    "rolamento", "luva", "óculos", "filtro", "graxa", "lâmpada", "disjuntor", "mangueira", "tinta",
+]
+
+
+def _texto(aleatorio, palavras):
+    return " ".join(aleatorio.choice(PALAVRAS) for _ in range(palavras)).capitalize()
+
+
+def requisicoes(quantidade, semente=0, fim=datetime(2026, 6, 30)):
+    """{número: dados} com até 5 itens cada, espalhados pelos dois anos até ``fim``."""
+    aleatorio = random.Random(semente)
+    documentos = {}
+    for n in range(quantidade):
+        data = fim - timedelta(seconds=aleatorio.randrange(2 * 365 * 24 * 3600))
+        numero = f"REQ-{data:%Y%m%d%H%M%S}-B{n // 1000:03d}-{n % 1000:03d}"
+        itens = []
+        for _ in range(aleatorio.randint(1, 5)):
+            quantidade_item = aleatorio.randint(1, 20)
+            valor_unitario = round(aleatorio.uniform(1, 500), 2)
+            itens.append({
+                "Descrição": _texto(aleatorio, 2),
+                "Quantidade": quantidade_item,
+                "Valor Unitário": valor_unitario,
+                "Subtotal": round(quantidade_item * valor_unitario, 2),
+            })
+        nome = f"{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)}"
+        documentos[numero] = {
+            "Número Solicitação": numero,
+            "Nome do Solicitante": nome,
+            "Nome Busca": normalizar(nome),
+            "Métier": aleatorio.choice(METIERS),
+            "Tipo": aleatorio.choice(["Serviço", "Produto"]),
+            "Itens": itens,
+            "Linha de Projeto": f"Linha {aleatorio.randint(1, 40)}",
+            "Produto Novo ou Backup": aleatorio.choice(["", "Novo", "Backup"]),
+            "Demanda Nova ou Prevista": aleatorio.choice(["Nova", "Prevista"]),
+            "Valor Total": round(sum(item["Subtotal"] for item in itens), 2),
+            "Orçamento": None,
+            "Comentários": _texto(aleatorio, 6),
+            "Riscos": _texto(aleatorio, 4),
+            "Status": aleatorio.choice(STATUS),
+            "Data Solicitação": f"{data:%Y-%m-%d %H:%M:%S}",
+            "Tipo de Compra": aleatorio.choice(TIPOS_COMPRA),
+        }
+    return documentos
+
+
+def almoxarifado(quantidade, semente=0, fim=datetime(2026, 6, 30)):
+    """{id: dados} em pedidos de 1 a 10 itens, sobre 500 MABECs."""
+    aleatorio = random.Random(semente + 1)
+    documentos = {}
+    pedido, restantes, item = None, 0, 0
+    for _ in range(quantidade):
+        if not restantes:
+            data = fim - timedelta(seconds=aleatorio.randrange(2 * 365 * 24 * 3600))
+            pedido = f"ALM-{data:%Y%m%d%H%M%S}-{aleatorio.randrange(16 ** 6):06X}"
+            nome = f"{aleatorio.choice(NOMES)} {aleatorio.choice(SOBRENOMES)}"
+            restantes, item = aleatorio.randint(1, 10), 0
+        restantes -= 1
+        item += 1
+        documentos[f"{pedido}-{item:03d}"] = {
+            "Nome do Solicitante": nome,
+            "MABEC": f"MB{aleatorio.randrange(500):05d}",
+            "Descrição do Produto": _texto(aleatorio, 2),
+            "Quantidade": aleatorio.randint(1, 50),
+            "Data Solicitação": f"{data:%Y-%m-%d %H:%M:%S}",
+            "Pedido": pedido,
+            "Item do Pedido": item,
+        }
+    return documentos
+
+
+def agregados(requisicoes_por_numero):
+    """Documentos da coleção 'agregados' coerentes com as requisições dadas."""
+    return {
+        id_grupo(chave): {**dict(zip(CAMPOS, chave)), "Quantidade": quantidade, "Valor": valor}
+        for chave, (quantidade, valor) in somar(requisicoes_por_numero.values()).items()
+    }
+
+
+def totais_mabec(itens_por_id):
+    """Documentos da coleção 'totais_mabec' coerentes com os itens dados."""
+    return {
+        id_grupo((codigo,)): {"MABEC": codigo, **total}
+        for codigo, total in somar_mabec(itens_por_id).items()
+    }
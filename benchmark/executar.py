@@ -0,0 +1,257 @@
+"""Mede as abas do app contra um Firestore em memória com carga sintética.
+
+Uso (na raiz do repositório):
+    python benchmark/executar.py --tamanhos 1000 10000 --saida resultado.json
+    python benchmark/executar.py --tamanhos 1000 --comparar linha_base.json
+
+Para cada tamanho, o banco recebe N requisições e N itens de almoxarifado, e
+cada cenário é aberto pelo AppTest do Streamlit com os caches limpos. Depois
+vêm ``--reruns`` execuções seguidas sem mudar nada. Por cenário saem:
+
+- primeira_ms: execução que desenha a aba pela primeira vez (caches frios);
+- rerun_mediana_ms / rerun_p95_ms: as execuções seguintes;
+- pico_memoria_mb: pico do tracemalloc, numa passada separada (ele atrasa tudo);
+- leituras_primeira / leituras_por_rerun: documentos lidos do banco;
+- payload_bytes: tamanho serializado dos elementos desenhados.
+
+Com --comparar, cada métrica que piorar mais que --tolerancia (e mais que um
+piso absoluto) é listada e o processo sai com código 1.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import dados  # noqa: E402
+import firestore_memoria  # noqa: E402
+
+APP = os.path.join(RAIZ, "app_requisicao.py")
+SENHA = "admin123"
+
+# Piora mínima, além da tolerância relativa, para contar como regressão
+PISOS = {
+    "primeira_ms": 20.0,
+    "rerun_mediana_ms": 5.0,
+    "rerun_p95_ms": 10.0,
+    "pico_memoria_mb": 1.0,
+    "leituras_primeira": 0,
+    "leituras_por_rerun": 0,
+    "payload_bytes": 1024,
+}
+
+
+def _selecionar_aba(nome):
+    def passo(at):
+        at.sidebar.selectbox[0].select(nome)
+    return passo
+
+
+def _digitar(rotulo, texto):
+    def passo(at):
+        next(campo for campo in at.text_input if campo.label.startswith(rotulo)).input(texto)
+    return passo
+
+
+# Cada cenário é uma lista de passos; depois de cada passo o script roda de novo
+CENARIOS = {
+    "nova_solicitacao": [],
+    "status": [_selecionar_aba("Conferir Status de Solicitação")],
+    "status_por_nome": [
+        _selecionar_aba("Conferir Status de Solicitação"),
+        _digitar("Filtrar por Nome", "ana"),
+    ],
+    "almox": [_selecionar_aba("Solicitação Almox")],
+    "historico": [
+        _selecionar_aba("Histórico (Acesso Restrito)"),
+        _digitar("Digite a senha", SENHA),
+    ],
+    "historico_busca": [
+        _selecionar_aba("Histórico (Acesso Restrito)"),
+        _digitar("Digite a senha", SENHA),
+        _digitar("Buscar por", "valvula mot"),
+    ],
+    "painel": [
+        _selecionar_aba("Painel de Compras"),
+        _digitar("Digite a senha", SENHA),
+    ],
+}
+
+
+class Ambiente:
+    """Banco em memória semeado e os remendos para o app usá-lo no lugar do Firebase."""
+
+    def __init__(self, tamanho, semente):
+        import firebase_admin
+        from firebase_admin import firestore
+        from google.cloud import firestore as firestore_google
+
+        self.banco = firestore_memoria.BancoMemoria()
+        requisicoes = dados.requisicoes(tamanho, semente)
+        almox = dados.almoxarifado(tamanho, semente)
+        self.banco.carregar("requisicoes", requisicoes)
+        self.banco.carregar("almoxarifado", almox)
+        self.banco.carregar("agregados", dados.agregados(requisicoes))
+        self.banco.carregar("totais_mabec", dados.totais_mabec(almox))
+
+        firebase_admin._apps.setdefault("[DEFAULT]", object())
+        firestore.client = lambda *args, **kwargs: self.banco
+        firestore_google.transactional = firestore_memoria.transactional
+
+    def app(self):
+        import streamlit as st
+        from streamlit.testing.v1 import AppTest
+
+        # Recursos em cache (espelho, índice, armazenamento) recomeçam a cada cenário
+        st.cache_resource.clear()
+        st.cache_data.clear()
+        self.banco.encerrar_ouvintes()
+        at = AppTest.from_file(APP, default_timeout=600)
+        at.secrets["firebase"] = {}
+        return at
+
+
+def _rodar(at):
+    inicio = time.perf_counter()
+    at.run()
+    decorrido = (time.perf_counter() - inicio) * 1000
+    if at.exception:
+        raise RuntimeError(at.exception[0].value)
+    return decorrido
+
+
+def _payload(no):
+    filhos = getattr(no, "children", None)
+    if filhos:
+        return sum(_payload(filho) for filho in filhos.values())
+    proto = getattr(no, "proto", None)
+    return len(proto.SerializeToString()) if proto is not None else 0
+
+
+def _abrir(ambiente, passos):
+    at = ambiente.app()
+    decorrido = _rodar(at)
+    for passo in passos:
+        passo(at)
+        decorrido = _rodar(at)
+    return at, decorrido
+
+
+def medir(ambiente, passos, reruns):
+    leituras = ambiente.banco.leituras
+    at, primeira = _abrir(ambiente, passos)
+    leituras_primeira = ambiente.banco.leituras - leituras
+
+    leituras = ambiente.banco.leituras
+    tempos = sorted(_rodar(at) for _ in range(reruns))
+    leituras_por_rerun = (ambiente.banco.leituras - leituras) / max(reruns, 1)
+    payload = _payload(at._tree)
+
+    tracemalloc.start()
+    try:
+        _abrir(ambiente, passos)
+        pico = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "primeira_ms": round(primeira, 1),
+        "rerun_mediana_ms": round(statistics.median(tempos), 1) if tempos else None,
+        "rerun_p95_ms": round(tempos[min(len(tempos) - 1, int(len(tempos) * 0.95))], 1) if tempos else None,
+        "pico_memoria_mb": round(pico / 2 ** 20, 1),
+        "leituras_primeira": leituras_primeira,
+        "leituras_por_rerun": round(leituras_por_rerun, 1),
+        "payload_bytes": payload,
+    }
+
+
+def comparar(atual, base, tolerancia):
+    """[(tamanho, cenário, métrica, base, atual)] para cada métrica que piorou."""
+    regressoes = []
+    for tamanho, cenarios in atual["resultados"].items():
+        for cenario, metricas in cenarios.items():
+            anteriores = base.get("resultados", {}).get(tamanho, {}).get(cenario, {})
+            for metrica, valor in metricas.items():
+                anterior = anteriores.get(metrica)
+                if anterior is None or valor is None or metrica not in PISOS:
+                    continue
+                if valor > anterior * (1 + tolerancia) and valor - anterior > PISOS[metrica]:
+                    regressoes.append((tamanho, cenario, metrica, anterior, valor))
+    return regressoes
+
+
+def _imprimir(tamanho, resultados):
+    colunas = list(PISOS)
+    print(f"\n== {tamanho} requisições / {tamanho} itens de almoxarifado ==")
+    print(f"{'cenário':<18}" + "".join(f"{coluna:>20}" for coluna in colunas))
+    for cenario, metricas in resultados.items():
+        print(f"{cenario:<18}" + "".join(f"{str(metricas.get(coluna)):>20}" for coluna in colunas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--cenarios", nargs="+", choices=list(CENARIOS), default=list(CENARIOS))
+    parser.add_argument("--reruns", type=int, default=5)
+    parser.add_argument("--semente", type=int, default=0)
+    parser.add_argument("--saida", help="arquivo JSON com os resultados")
+    parser.add_argument("--comparar", help="JSON de uma execução anterior, usado como linha de base")
+    parser.add_argument("--tolerancia", type=float, default=0.2, help="piora relativa aceita (0.2 = 20%%)")
+    args = parser.parse_args()
+    saida = args.saida and os.path.abspath(args.saida)
+    linha_base = args.comparar and os.path.abspath(args.comparar)
+
+    # Fila de envios e uploads num diretório descartável; nada de métricas em arquivo
+    trabalho = tempfile.mkdtemp(prefix="requis-benchmark-")
+    os.chdir(trabalho)
+    os.environ.update(REQUIS_BACKEND="firestore", REQUIS_FILA=os.path.join(trabalho, "fila.jsonl"))
+    os.environ.pop("REQUIS_METRICAS", None)
+    os.environ.pop("REQUIS_PROMETHEUS", None)
+
+    import streamlit
+    from streamlit.logger import set_log_level
+    # Limpar caches fora de um servidor gera avisos a cada cenário
+    set_log_level("error")
+
+    relatorio = {
+        "ambiente": {
+            "data": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "streamlit": streamlit.__version__,
+            "plataforma": platform.platform(),
+        },
+        "parametros": {"reruns": args.reruns, "semente": args.semente},
+        "resultados": {},
+    }
+    for tamanho in args.tamanhos:
+        ambiente = Ambiente(tamanho, args.semente)
+        resultados = relatorio["resultados"][str(tamanho)] = {}
+        for cenario in args.cenarios:
+            resultados[cenario] = medir(ambiente, CENARIOS[cenario], args.reruns)
+        _imprimir(tamanho, resultados)
+
+    if saida:
+        with open(saida, "w", encoding="utf-8") as f:
+            json.dump(relatorio, f, ensure_ascii=False, indent=2)
+
+    if linha_base:
+        with open(linha_base, encoding="utf-8") as f:
+            base = json.load(f)
+        regressoes = comparar(relatorio, base, args.tolerancia)
+        for tamanho, cenario, metrica, anterior, valor in regressoes:
+            print(f"REGRESSÃO {tamanho}/{cenario}/{metrica}: {anterior} -> {valor}")
+        if regressoes:
+            raise SystemExit(1)
+        print(f"\nSem regressões em relação a {args.comparar}.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+"""Firestore em memória, só com a parte da API que o app usa.
+
+Serve para rodar o app e medir as abas sem credenciais. Conta documentos
+lidos e escritos como o Firestore cobra: cada documento devolvido por uma
+consulta ou listener é uma leitura, e uma consulta vazia conta uma.
+"""
+import copy
+import threading
+import uuid
+
+from google.api_core.exceptions import AlreadyExists, NotFound
+from google.cloud.firestore import Increment
+
+_OPERADORES = {
+    "==": lambda valor, alvo: valor == alvo,
+    "<": lambda valor, alvo: valor is not None and valor < alvo,
+    "<=": lambda valor, alvo: valor is not None and valor <= alvo,
+    ">": lambda valor, alvo: valor is not None and valor > alvo,
+    ">=": lambda valor, alvo: valor is not None and valor >= alvo,
+    "in": lambda valor, alvo: valor in alvo,
+}
+
+
+def _campo(caminho):
+    return caminho.strip("`")
+
+
+def _aplicar(atual, dados):
+    # Resolve os Increment sobre o valor atual do campo
+    return {
+        chave: (atual.get(chave) or 0) + valor.value if isinstance(valor, Increment) else copy.deepcopy(valor)
+        for chave, valor in dados.items()
+    }
+
+
+class Snapshot:
+
+    def __init__(self, referencia, dados):
+        self.reference = referencia
+        self.id = referencia.id
+        self._dados = dados
+
+    @property
+    def exists(self):
+        return self._dados is not None
+
+    def to_dict(self):
+        return copy.deepcopy(self._dados)
+
+    def get(self, caminho):
+        return (self._dados or {}).get(_campo(caminho))
+
+
+class _TipoMudanca:
+
+    def __init__(self, nome):
+        self.name = nome
+
+
+class Mudanca:
+
+    def __init__(self, tipo, documento):
+        self.type = _TipoMudanca(tipo)
+        self.document = documento
+
+
+class Documento:
+
+    def __init__(self, colecao, doc_id):
+        self._colecao = colecao
+        self.id = doc_id
+
+    @property
+    def _banco(self):
+        return self._colecao._banco
+
+    def get(self, transaction=None):
+        with self._banco._lock:
+            self._banco.leituras += 1
+            dados = self._colecao._docs.get(self.id)
+            return Snapshot(self, copy.deepcopy(dados))
+
+    def set(self, dados, merge=False):
+        with self._banco._lock:
+            self._set(dados, merge)
+            self._banco.escritas += 1
+
+    def create(self, dados):
+        with self._banco._lock:
+            self._verificar("create")
+            self._set(dados)
+            self._banco.escritas += 1
+
+    def update(self, dados):
+        with self._banco._lock:
+            self._verificar("update")
+            self._set(dados, merge=True)
+            self._banco.escritas += 1
+
+    def delete(self):
+        with self._banco._lock:
+            self._delete()
+            self._banco.escritas += 1
+
+    # As versões sem trava são usadas também pelos lotes e transações
+    def _verificar(self, operacao):
+        existe = self.id in self._colecao._docs
+        if operacao == "create" and existe:
+            raise AlreadyExists(f"Documento já existe: {self._colecao.id}/{self.id}")
+        if operacao == "update" and not existe:
+            raise NotFound(f"Documento não encontrado: {self._colecao.id}/{self.id}")
+
+    def _set(self, dados, merge=False):
+        atual = self._colecao._docs.get(self.id) or {}
+        novos = _aplicar(atual, {_campo(chave): valor for chave, valor in dados.items()})
+        self._colecao._docs[self.id] = {**atual, **novos} if merge else novos
+        self._colecao._avisar("MODIFIED" if atual else "ADDED", self)
+
+    def _delete(self):
+        if self._colecao._docs.pop(self.id, None) is not None:
+            self._colecao._avisar("REMOVED", self)
+
+
+class Consulta:
+
+    def __init__(self, colecao, filtros=(), ordens=(), limite=None, depois_de=None):
+        self._colecao = colecao
+        self._filtros = filtros
+        self._ordens = ordens
+        self._limite = limite
+        self._depois_de = depois_de
+
+    def _copiar(self, **mudancas):
+        atributos = dict(filtros=self._filtros, ordens=self._ordens, limite=self._limite, depois_de=self._depois_de)
+        atributos.update(mudancas)
+        return Consulta(self._colecao, **atributos)
+
+    def where(self, campo=None, operador=None, valor=None, filter=None):
+        if filter is not None:
+            campo, operador, valor = filter.field_path, filter.op_string, filter.value
+        return self._copiar(filtros=self._filtros + ((_campo(campo), operador, valor),))
+
+    def order_by(self, campo, direction="ASCENDING"):
+        return self._copiar(ordens=self._ordens + ((_campo(campo), direction == "DESCENDING"),))
+
+    def limit(self, quantidade):
+        return self._copiar(limite=quantidade)
+
+    def start_after(self, snapshot):
+        return self._copiar(depois_de=snapshot)
+
+    def _chave(self, campo, doc_id, dados):
+        return doc_id if campo == "__name__" else dados.get(campo)
+
+    def stream(self, transaction=None):
+        banco = self._colecao._banco
+        with banco._lock:
+            docs = [
+                (doc_id, dados) for doc_id, dados in self._colecao._docs.items()
+                if all(
+                    campo in dados and _OPERADORES[operador](dados.get(campo), valor)
+                    for campo, operador, valor in self._filtros
+                )
+            ]
+            ordens = self._ordens if any(campo == "__name__" for campo, _ in self._ordens) \
+                else self._ordens + (("__name__", self._ordens[-1][1] if self._ordens else False),)
+            # Como no Firestore, ordenar por um campo exclui quem não o tem
+            docs = [(doc_id, dados) for doc_id, dados in docs if all(
+                campo == "__name__" or campo in dados for campo, _ in ordens
+            )]
+            for campo, descendente in reversed(ordens):
+                docs.sort(key=lambda par: self._chave(campo, *par), reverse=descendente)
+            if self._depois_de is not None:
+                ids = [doc_id for doc_id, _ in docs]
+                if self._depois_de.id in ids:
+                    docs = docs[ids.index(self._depois_de.id) + 1:]
+            if self._limite is not None:
+                docs = docs[:self._limite]
+            banco.leituras += max(1, len(docs))
+            resultado = [Snapshot(Documento(self._colecao, doc_id), copy.deepcopy(dados)) for doc_id, dados in docs]
+        return iter(resultado)
+
+    def get(self, transaction=None):
+        return list(self.stream())
+
+
+class Colecao(Consulta):
+
+    def __init__(self, banco, nome):
+        super().__init__(self)
+        self._banco = banco
+        self.id = nome
+        self._docs = {}
+        self._ouvintes = []
+
+    def document(self, doc_id=None):
+        return Documento(self, doc_id or uuid.uuid4().hex[:20])
+
+    def add(self, dados):
+        referencia = self.document()
+        referencia.set(dados)
+        return None, referencia
+
+    def on_snapshot(self, callback):
+        with self._banco._lock:
+            self._ouvintes.append(callback)
+            iniciais = [
+                Mudanca("ADDED", Snapshot(Documento(self, doc_id), copy.deepcopy(dados)))
+                for doc_id, dados in self._docs.items()
+            ]
+            self._banco.leituras += max(1, len(iniciais))
+        callback([], iniciais, None)
+        colecao = self
+
+        class Inscricao:
+            def unsubscribe(self):
+                with colecao._banco._lock:
+                    if callback in colecao._ouvintes:
+                        colecao._ouvintes.remove(callback)
+        return Inscricao()
+
+    def _avisar(self, tipo, referencia):
+        # Chamado com a trava do banco; o Firestore entrega numa thread própria
+        if not self._ouvintes:
+            return
+        dados = copy.deepcopy(self._docs.get(referencia.id))
+        for callback in list(self._ouvintes):
+            self._banco.leituras += 1
+            callback([], [Mudanca(tipo, Snapshot(referencia, dados))], None)
+
+
+class Lote:
+    """WriteBatch e Transaction: as escritas só valem no commit, todas ou nenhuma."""
+
+    def __init__(self, banco):
+        self._banco = banco
+        self._operacoes = []
+
+    def get(self, referencia_ou_consulta):
+        if isinstance(referencia_ou_consulta, Consulta):
+            return referencia_ou_consulta.stream()
+        return referencia_ou_consulta.get()
+
+    def set(self, referencia, dados, merge=False):
+        self._operacoes.append(("set", referencia, dados, merge))
+
+    def create(self, referencia, dados):
+        self._operacoes.append(("create", referencia, dados, False))
+
+    def update(self, referencia, dados):
+        self._operacoes.append(("update", referencia, dados, True))
+
+    def delete(self, referencia):
+        self._operacoes.append(("delete", referencia, None, False))
+
+    def commit(self):
+        if len(self._operacoes) > 500:
+            raise ValueError("Um lote aceita no máximo 500 escritas")
+        with self._banco._lock:
+            for operacao, referencia, _, _ in self._operacoes:
+                referencia._verificar(operacao)
+            for operacao, referencia, dados, merge in self._operacoes:
+                if operacao == "delete":
+                    referencia._delete()
+                else:
+                    referencia._set(dados, merge)
+            self._banco.escritas += len(self._operacoes)
+        self._operacoes = []
+        return []
+
+
+def transactional(funcao):
+    """Substituto de ``firestore.transactional`` para o Lote acima."""
+    def executar(transacao, *args, **kwargs):
+        resultado = funcao(transacao, *args, **kwargs)
+        transacao.commit()
+        return resultado
+    return executar
+
+
+class BancoMemoria:
+
+    def __init__(self):
+        # Reentrante: listeners podem ler o banco enquanto recebem uma mudança
+        self._lock = threading.RLock()
+        self._colecoes = {}
+        self.leituras = 0
+        self.escritas = 0
+
+    def collection(self, nome):
+        with self._lock:
+            if nome not in self._colecoes:
+                self._colecoes[nome] = Colecao(self, nome)
+            return self._colecoes[nome]
+
+    def batch(self):
+        return Lote(self)
+
+    def transaction(self, **kwargs):
+        return Lote(self)
+
+    def get_all(self, referencias, transaction=None):
+        return [referencia.get() for referencia in referencias]
+
+    def carregar(self, colecao, documentos):
+        """Carga direta de {id: dados}, sem contar escritas nem avisar listeners."""
+        with self._lock:
+            self.collection(colecao)._docs.update(copy.deepcopy(documentos))
+
+    def encerrar_ouvintes(self):
+        with self._lock:
+            for colecao in self._colecoes.values():
+                colecao._ouvintes.clear()
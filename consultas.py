@@ -0,0 +1,92 @@
+import unicodedata
+
+from armazenamento import Pagina
+
+CAMPO_NOME_BUSCA = "`Nome Busca`"
+CAMPO_DATA = "`Data Solicitação`"
+CAMPO_ID = "__name__"
+
+# Caractere alto usado como limite superior em consultas de prefixo
+FIM_PREFIXO = "\uf8ff"
+
+
+def normalizar(texto):
+    """Minúsculas e sem acentos, usado no campo 'Nome Busca'."""
+    texto = unicodedata.normalize("NFKD", str(texto or ""))
+    texto = "".join(c for c in texto if not unicodedata.combining(c))
+    return " ".join(texto.lower().split())
+
+
+def numero_valido(numero):
+    """Número em maiúsculas, ou None se não puder ser ID de documento.
+
+    O número digitado vira o caminho do documento: '/' mudaria o caminho e
+    o Firestore recusa vazio, '.', '..' e nomes '__...__'.
+    """
+    numero = str(numero or "").strip().upper()
+    if (
+        not numero or "/" in numero or numero in (".", "..")
+        or (numero.startswith("__") and numero.endswith("__"))
+        or len(numero.encode("utf-8")) > 1500
+    ):
+        return None
+    return numero
+
+
+def buscar_por_numero(colecao_ref, numero):
+    numero = numero_valido(numero)
+    if numero is None:
+        return None
+    doc = colecao_ref.document(numero).get()
+    return doc.to_dict() if doc.exists else None
+
+
+def _paginar(consulta, tamanho, cursor):
+    if cursor is not None:
+        consulta = consulta.start_after(cursor)
+    # Um documento a mais só para saber se existe próxima página
+    docs = list(consulta.limit(tamanho + 1).stream())
+    tem_mais = len(docs) > tamanho
+    docs = docs[:tamanho]
+    return Pagina(
+        documentos=[doc.to_dict() for doc in docs],
+        cursor=docs[-1] if docs else cursor,
+        tem_mais=tem_mais,
+        ids=[doc.id for doc in docs],
+    )
+
+
+def pagina_por_nome(colecao_ref, prefixo, tamanho=20, cursor=None):
+    prefixo = normalizar(prefixo)
+    consulta = (
+        colecao_ref
+        .where(CAMPO_NOME_BUSCA, ">=", prefixo)
+        .where(CAMPO_NOME_BUSCA, "<", prefixo + FIM_PREFIXO)
+        .order_by(CAMPO_NOME_BUSCA)
+        .order_by(CAMPO_ID)
+    )
+    return _paginar(consulta, tamanho, cursor)
+
+
+def pagina_por_data(colecao_ref, tamanho=500, cursor=None, inicio=None, fim=None, status=None):
+    """Página em ordem crescente de data, de ``inicio`` (incluso) a ``fim`` (excluso).
+
+    Com ``status``, pede o índice composto Status + Data Solicitação + __name__.
+    """
+    consulta = colecao_ref
+    if status:
+        consulta = consulta.where("Status", "in", list(status))
+    if inicio:
+        consulta = consulta.where(CAMPO_DATA, ">=", inicio)
+    if fim:
+        consulta = consulta.where(CAMPO_DATA, "<", fim)
+    return _paginar(consulta.order_by(CAMPO_DATA).order_by(CAMPO_ID), tamanho, cursor)
+
+
+def pagina_recentes(colecao_ref, tamanho=20, cursor=None):
+    consulta = (
+        colecao_ref
+        .order_by(CAMPO_DATA, direction="DESCENDING")
+        .order_by(CAMPO_ID, direction="DESCENDING")
+    )
+    return _paginar(consulta, tamanho, cursor)
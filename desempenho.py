@@ -0,0 +1,404 @@
+import contextvars
+import json
+import logging
+import os
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+
+from armazenamento import Armazenamento
+
+# Momento em que o módulo foi importado pela primeira vez no processo
+INICIO_PROCESSO = time.time()
+
+logger = logging.getLogger("requisicoes.desempenho")
+
+# Arquivo no formato texto do Prometheus (coletor textfile do node_exporter)
+CAMINHO_PROMETHEUS = os.environ.get("REQUIS_PROMETHEUS")
+
+# Segundos mínimos entre duas regravações do arquivo do Prometheus
+INTERVALO_PROMETHEUS = 15
+
+# Medição do rerun em andamento na thread do script (ou na leitura disparada por ele)
+_medicao_atual = contextvars.ContextVar("medicao_atual", default=None)
+
+
+def gravar_metrica(registro):
+    """Acrescenta um registro ao arquivo JSONL de REQUIS_METRICAS, se definido."""
+    caminho = os.environ.get("REQUIS_METRICAS")
+    if not caminho:
+        return
+    with open(caminho, "a", encoding="utf-8") as f:
+        f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+
+
+class RelatorioInicializacao:
+    """Tempo até a primeira pintura e sobrecarga de cada rerun, por processo.
+
+    A sobrecarga é o tempo do início do script até o desvio para a aba
+    (importações, recursos em cache, configuração da página e CSS).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.primeira_pintura_ms = None
+        self.reruns = 0
+        self.sobrecarga_total_ms = 0.0
+        self.sobrecarga_max_ms = 0.0
+        self.rerun_total_ms = 0.0
+        self.ultimo = None
+
+    def registrar_pintura(self, decorrido):
+        with self._lock:
+            if self.primeira_pintura_ms is not None:
+                return
+            self.primeira_pintura_ms = decorrido * 1000
+        registro = {
+            "evento": "inicializacao",
+            "momento": time.time(),
+            "primeira_pintura_ms": round(self.primeira_pintura_ms, 1),
+            "processo_ate_pintura_s": round(time.time() - INICIO_PROCESSO, 3),
+        }
+        logger.info("Primeira pintura em %.0f ms", self.primeira_pintura_ms)
+        gravar_metrica(registro)
+
+    def registrar_rerun(self, aba, sobrecarga, total):
+        with self._lock:
+            self.reruns += 1
+            self.sobrecarga_total_ms += sobrecarga * 1000
+            self.sobrecarga_max_ms = max(self.sobrecarga_max_ms, sobrecarga * 1000)
+            self.rerun_total_ms += total * 1000
+            self.ultimo = {"aba": aba, "sobrecarga_ms": round(sobrecarga * 1000, 1), "total_ms": round(total * 1000, 1)}
+            reruns = self.reruns
+        if reruns % 100 == 0:
+            gravar_metrica(dict(self.resumo(), evento="resumo_reruns", momento=time.time()))
+
+    def resumo(self):
+        with self._lock:
+            reruns = self.reruns or 1
+            return {
+                "primeira_pintura_ms": self.primeira_pintura_ms and round(self.primeira_pintura_ms, 1),
+                "reruns": self.reruns,
+                "sobrecarga_media_ms": round(self.sobrecarga_total_ms / reruns, 1),
+                "sobrecarga_max_ms": round(self.sobrecarga_max_ms, 1),
+                "rerun_medio_ms": round(self.rerun_total_ms / reruns, 1),
+                "ultimo_rerun": self.ultimo,
+            }
+
+
+class MetricasProcesso:
+    """Totais acumulados desde o início do processo, exportados para o Prometheus.
+
+    Somam tudo o que roda no processo: reruns de todas as sessões, a fila de
+    envios e os listeners do espelho.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.etapas = {}
+        self.leituras = Counter()
+        self.escritas = Counter()
+        self.reruns = {}
+        self._exportado_em = 0.0
+
+    def somar_etapa(self, nome, segundos):
+        with self._lock:
+            vezes, total = self.etapas.get(nome, (0, 0.0))
+            self.etapas[nome] = (vezes + 1, total + segundos)
+
+    def contar(self, contador, colecao, quantidade):
+        with self._lock:
+            contador[colecao] += quantidade
+
+    def somar_rerun(self, aba, segundos, elementos, bytes_enviados):
+        with self._lock:
+            reruns, total, total_elementos, total_bytes = self.reruns.get(aba, (0, 0.0, 0, 0))
+            self.reruns[aba] = (reruns + 1, total + segundos, total_elementos + elementos, total_bytes + bytes_enviados)
+
+    def prometheus(self):
+        """Texto no formato de exposição do Prometheus."""
+        with self._lock:
+            series = [
+                ("requis_etapa_execucoes_total", "Vezes que cada etapa rodou.", "etapa",
+                 {nome: vezes for nome, (vezes, _) in self.etapas.items()}),
+                ("requis_etapa_segundos_total", "Tempo acumulado em cada etapa.", "etapa",
+                 {nome: segundos for nome, (_, segundos) in self.etapas.items()}),
+                ("requis_documentos_lidos_total", "Documentos lidos do banco.", "colecao", dict(self.leituras)),
+                ("requis_documentos_gravados_total", "Documentos gravados ou apagados no banco.", "colecao", dict(self.escritas)),
+                ("requis_reruns_total", "Reruns completos do script.", "aba",
+                 {aba: valores[0] for aba, valores in self.reruns.items()}),
+                ("requis_rerun_segundos_total", "Tempo acumulado dos reruns.", "aba",
+                 {aba: valores[1] for aba, valores in self.reruns.items()}),
+                ("requis_elementos_total", "Elementos enviados ao navegador.", "aba",
+                 {aba: valores[2] for aba, valores in self.reruns.items()}),
+                ("requis_elementos_bytes_total", "Bytes dos elementos enviados ao navegador.", "aba",
+                 {aba: valores[3] for aba, valores in self.reruns.items()}),
+            ]
+        linhas = []
+        for nome, ajuda, rotulo, valores in series:
+            linhas += [f"# HELP {nome} {ajuda}", f"# TYPE {nome} counter"]
+            linhas += [f'{nome}{{{rotulo}="{_escapar(chave)}"}} {valor:g}' for chave, valor in sorted(valores.items())]
+        linhas += [
+            "# HELP requis_processo_inicio_segundos Momento em que o processo começou (epoch).",
+            "# TYPE requis_processo_inicio_segundos gauge",
+            f"requis_processo_inicio_segundos {INICIO_PROCESSO:.3f}",
+        ]
+        return "\n".join(linhas) + "\n"
+
+    def exportar_prometheus(self, forcar=False):
+        """Regrava o arquivo de REQUIS_PROMETHEUS, no máximo a cada INTERVALO_PROMETHEUS segundos.
+
+        O arquivo é trocado inteiro (escreve ao lado e renomeia), então o
+        coletor nunca lê um arquivo pela metade.
+        """
+        if not CAMINHO_PROMETHEUS:
+            return
+        with self._lock:
+            agora = time.time()
+            if not forcar and agora - self._exportado_em < INTERVALO_PROMETHEUS:
+                return
+            self._exportado_em = agora
+        temporario = f"{CAMINHO_PROMETHEUS}.{os.getpid()}.tmp"
+        with open(temporario, "w", encoding="utf-8") as f:
+            f.write(self.prometheus())
+        os.replace(temporario, CAMINHO_PROMETHEUS)
+
+
+def _escapar(valor):
+    return str(valor).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+METRICAS = MetricasProcesso()
+
+
+@contextmanager
+def etapa(nome):
+    """Cronometra o bloco, somando o tempo ao rerun em andamento e aos totais do processo."""
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        decorrido = time.perf_counter() - inicio
+        METRICAS.somar_etapa(nome, decorrido)
+        medicao = _medicao_atual.get()
+        if medicao is not None:
+            medicao.somar_etapa(nome, decorrido)
+
+
+def contar_leituras(colecao, quantidade):
+    METRICAS.contar(METRICAS.leituras, colecao, quantidade)
+    medicao = _medicao_atual.get()
+    if medicao is not None:
+        medicao.contar(medicao.leituras, colecao, quantidade)
+
+
+def contar_escritas(colecao, quantidade):
+    METRICAS.contar(METRICAS.escritas, colecao, quantidade)
+    medicao = _medicao_atual.get()
+    if medicao is not None:
+        medicao.contar(medicao.escritas, colecao, quantidade)
+
+
+def no_rerun(funcao):
+    """Para tarefas enviadas a um pool: o que elas medirem conta para o rerun que as criou."""
+    contexto = contextvars.copy_context()
+
+    def executar(*args, **kwargs):
+        return contexto.run(funcao, *args, **kwargs)
+    return executar
+
+
+def _contar_elementos():
+    # Cada delta enviado ao navegador passa pelo enqueue do contexto do script,
+    # que é o mesmo em todos os reruns da sessão: basta envolvê-lo uma vez.
+    # _enqueue é interno do Streamlit; se sumir numa versão nova, a contagem
+    # de elementos fica zerada e o resto da medição segue normal
+    try:
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+    except ImportError:
+        return
+    contexto = get_script_run_ctx(suppress_warning=True)
+    enviar = getattr(contexto, "_enqueue", None)
+    if not callable(enviar) or getattr(enviar, "contando_elementos", False):
+        return
+
+    def enviar_contando(mensagem):
+        medicao = _medicao_atual.get()
+        if medicao is not None and mensagem.HasField("delta"):
+            medicao.contar_elemento(mensagem.ByteSize())
+        enviar(mensagem)
+    enviar_contando.contando_elementos = True
+    contexto._enqueue = enviar_contando
+
+
+class MedicaoRerun:
+    """Etapas, documentos lidos e gravados e elementos desenhados de um rerun.
+
+    Criada no início do script; a partir daí ``etapa`` e os contadores de
+    leitura e escrita, na mesma thread, somam aqui. Leituras feitas em outras
+    threads só entram se a tarefa for embrulhada com ``no_rerun``.
+    """
+
+    def __init__(self, inicio=None):
+        self._lock = threading.Lock()
+        self.inicio = inicio if inicio is not None else time.perf_counter()
+        self.etapas = {}
+        self.leituras = Counter()
+        self.escritas = Counter()
+        self.elementos = 0
+        self.bytes_enviados = 0
+        _medicao_atual.set(self)
+        _contar_elementos()
+
+    def somar_etapa(self, nome, segundos):
+        with self._lock:
+            vezes, total = self.etapas.get(nome, (0, 0.0))
+            self.etapas[nome] = (vezes + 1, total + segundos)
+
+    def contar(self, contador, colecao, quantidade):
+        with self._lock:
+            contador[colecao] += quantidade
+
+    def contar_elemento(self, tamanho):
+        with self._lock:
+            self.elementos += 1
+            self.bytes_enviados += tamanho
+
+    def encerrar(self, aba):
+        """Fecha a medição, soma aos totais do processo e grava o registro; retorna o registro."""
+        total = time.perf_counter() - self.inicio
+        if _medicao_atual.get() is self:
+            _medicao_atual.set(None)
+        with self._lock:
+            registro = {
+                "evento": "rerun",
+                "momento": time.time(),
+                "aba": aba,
+                "total_ms": round(total * 1000, 1),
+                "etapas": {
+                    nome: {"vezes": vezes, "ms": round(segundos * 1000, 1)}
+                    for nome, (vezes, segundos) in sorted(self.etapas.items(), key=lambda par: -par[1][1])
+                },
+                "leituras": dict(self.leituras),
+                "escritas": dict(self.escritas),
+                "elementos": self.elementos,
+                "bytes_enviados": self.bytes_enviados,
+            }
+        METRICAS.somar_rerun(aba, total, self.elementos, self.bytes_enviados)
+        gravar_metrica(registro)
+        METRICAS.exportar_prometheus()
+        return registro
+
+
+def _lidos(pagina):
+    # Como o Firestore cobra: a página lê um documento a mais quando há próxima, e vazia conta um
+    return max(1, len(pagina.documentos) + bool(pagina.tem_mais))
+
+
+class ArmazenamentoMedido(Armazenamento):
+    """Repassa cada operação ao armazenamento real, cronometrando-a e contando
+    documentos lidos e gravados por coleção.
+
+    As contagens vêm do que passa pela interface; os totais do painel e por
+    MABEC que os backends atualizam junto com cada gravação não são contados.
+    """
+
+    def __init__(self, interno):
+        self.interno = interno
+
+    def _chamar(self, metodo, *args):
+        with etapa(f"armazenamento.{metodo}"):
+            return getattr(self.interno, metodo)(*args)
+
+    # ---- requisicoes ----
+    def obter_requisicao(self, numero):
+        dados = self._chamar("obter_requisicao", numero)
+        contar_leituras("requisicoes", 1)
+        return dados
+
+    def salvar_requisicao(self, dados):
+        self._chamar("salvar_requisicao", dados)
+        contar_escritas("requisicoes", 1)
+
+    def salvar_requisicoes(self, lista):
+        self._chamar("salvar_requisicoes", lista)
+        contar_escritas("requisicoes", len(lista))
+
+    def atualizar_status(self, numero, status):
+        atualizado = self._chamar("atualizar_status", numero, status)
+        contar_leituras("requisicoes", 1)
+        contar_escritas("requisicoes", int(bool(atualizado)))
+        return atualizado
+
+    def atualizar_status_em_lote(self, numeros, status):
+        atualizados, nao_encontrados = self._chamar("atualizar_status_em_lote", numeros, status)
+        contar_leituras("requisicoes", atualizados + len(nao_encontrados))
+        contar_escritas("requisicoes", atualizados)
+        return atualizados, nao_encontrados
+
+    def excluir_requisicao(self, numero):
+        excluida = self._chamar("excluir_requisicao", numero)
+        contar_leituras("requisicoes", 1)
+        contar_escritas("requisicoes", int(bool(excluida)))
+        return excluida
+
+    def pagina_por_nome(self, prefixo, tamanho=20, cursor=None):
+        pagina = self._chamar("pagina_por_nome", prefixo, tamanho, cursor)
+        contar_leituras("requisicoes", _lidos(pagina))
+        return pagina
+
+    def pagina_recentes(self, tamanho=20, cursor=None, colecao="requisicoes"):
+        pagina = self._chamar("pagina_recentes", tamanho, cursor, colecao)
+        contar_leituras(colecao, _lidos(pagina))
+        return pagina
+
+    def pagina_por_data(self, colecao, tamanho=500, cursor=None, inicio=None, fim=None, status=None):
+        pagina = self._chamar("pagina_por_data", colecao, tamanho, cursor, inicio, fim, status)
+        contar_leituras(colecao, _lidos(pagina))
+        return pagina
+
+    # ---- almoxarifado ----
+    def enviar_pedido_almox(self, itens):
+        resultado = self._chamar("enviar_pedido_almox", itens)
+        # Cada item é lido antes de gravado, para não contar duas vezes nos totais
+        contar_leituras("almoxarifado", len(itens))
+        contar_escritas("almoxarifado", len(itens))
+        return resultado
+
+    def excluir_almox(self, doc_id):
+        existia = self._chamar("excluir_almox", doc_id)
+        contar_leituras("almoxarifado", 1)
+        contar_escritas("almoxarifado", int(bool(existia)))
+        return existia
+
+    def totais_mabec(self):
+        totais = self._chamar("totais_mabec")
+        contar_leituras("totais_mabec", max(1, len(totais)))
+        return totais
+
+    def corrigir_totais_mabec(self, totais):
+        self._chamar("corrigir_totais_mabec", totais)
+        contar_escritas("totais_mabec", len(totais))
+
+    # ---- agregados do painel ----
+    def agregados(self):
+        totais = self._chamar("agregados")
+        contar_leituras("agregados", max(1, len(totais)))
+        return totais
+
+    def corrigir_agregados(self, totais):
+        self._chamar("corrigir_agregados", totais)
+        contar_escritas("agregados", len(totais))
+
+    # ---- leitura de coleções inteiras ----
+    def listar(self, colecao):
+        documentos = self._chamar("listar", colecao)
+        contar_leituras(colecao, max(1, len(documentos)))
+        return documentos
+
+    def escutar(self, colecao, callback):
+        def ao_receber(mudancas):
+            contar_leituras(colecao, max(1, len(mudancas)))
+            callback(mudancas)
+        return self.interno.escutar(colecao, ao_receber)
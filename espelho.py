@@ -0,0 +1,113 @@
+import threading
+import time
+
+
+class EspelhoColecao:
+    """Cópia em memória de uma coleção, mantida pelo ``escutar`` do armazenamento.
+
+    Uma única instância por processo é compartilhada por todas as sessões
+    (ver ``obter_espelho`` no app). A carga inicial chega na primeira
+    notificação; depois disso só os documentos alterados são aplicados.
+    ``transformar`` é aplicado uma única vez a cada documento que chega.
+    """
+
+    def __init__(self, armazenamento, colecao, transformar=None, espera_inicial=30):
+        self._armazenamento = armazenamento
+        self._colecao = colecao
+        self._transformar = transformar or (lambda dados: dados)
+        self._espera_inicial = espera_inicial
+        self._lock = threading.Lock()
+        self._pronto = threading.Event()
+        self._docs = {}
+        self._versao = 0
+        self._derivados = {}
+        self._inscritos = []
+
+        # Contadores expostos em estatisticas()
+        self.acertos = 0
+        self.faltas = 0
+        self.eventos = 0
+        self.ultima_sincronizacao = None
+
+        self._inscricao = armazenamento.escutar(colecao, self._ao_receber)
+
+    def _ao_receber(self, mudancas):
+        with self._lock:
+            for doc_id, dados in mudancas:
+                if dados is None:
+                    self._docs.pop(doc_id, None)
+                else:
+                    self._docs[doc_id] = self._transformar(dados)
+            self._avisar([(doc_id, self._docs.get(doc_id)) for doc_id, _ in mudancas])
+            self._versao += 1
+            self.eventos += 1
+            self.ultima_sincronizacao = time.time()
+        self._pronto.set()
+
+    def _carga_completa(self):
+        # Usado só se o listener não entregar a primeira notificação a tempo
+        docs = {
+            doc_id: self._transformar(dados)
+            for doc_id, dados in self._armazenamento.listar(self._colecao).items()
+        }
+        with self._lock:
+            if not self._pronto.is_set():
+                removidos = [(doc_id, None) for doc_id in self._docs if doc_id not in docs]
+                self._docs = docs
+                self._avisar(removidos + list(docs.items()))
+                self._versao += 1
+                self.ultima_sincronizacao = time.time()
+        self._pronto.set()
+
+    def _avisar(self, mudancas):
+        # Chamado com o lock: os inscritos recebem as mudanças na mesma ordem do espelho
+        for funcao in self._inscritos:
+            funcao(mudancas)
+
+    def inscrever(self, funcao):
+        """Chama funcao(mudancas) com os documentos atuais e depois a cada alteração.
+
+        ``mudancas`` é uma lista de (id, dados já transformados); dados None
+        indica remoção. A função roda com o espelho travado e deve ser rápida.
+        """
+        with self._lock:
+            self._inscritos.append(funcao)
+            funcao(list(self._docs.items()))
+
+    def derivado(self, chave, construir):
+        """Resultado de construir(documentos), recalculado só quando a coleção muda.
+
+        O objeto devolvido é compartilhado entre sessões e não deve ser alterado.
+        """
+        if not self._pronto.wait(self._espera_inicial):
+            self._carga_completa()
+        with self._lock:
+            versao, valor = self._derivados.get(chave, (-1, None))
+            if versao == self._versao:
+                self.acertos += 1
+                return valor
+            self.faltas += 1
+            versao = self._versao
+            docs = list(self._docs.values())
+        valor = construir(docs)
+        with self._lock:
+            self._derivados[chave] = (versao, valor)
+        return valor
+
+    def estatisticas(self):
+        with self._lock:
+            atraso = None
+            if self.ultima_sincronizacao is not None:
+                atraso = time.time() - self.ultima_sincronizacao
+            return {
+                "documentos": len(self._docs),
+                "versao": self._versao,
+                "acertos": self.acertos,
+                "faltas": self.faltas,
+                "eventos": self.eventos,
+                "segundos_desde_sincronizacao": atraso,
+                "carregado": self._pronto.is_set(),
+            }
+
+    def encerrar(self):
+        self._inscricao.unsubscribe()
@@ -0,0 +1,210 @@
+"""Exportação do histórico em CSV ou Parquet, página a página.
+
+Uso:
+    python exportacao.py requisicoes --de 2026-01-01 --ate 2026-01-31 --saida janeiro.csv
+    python exportacao.py requisicoes --status Pago --formato parquet --saida pagos.parquet
+    python exportacao.py almoxarifado --de 2026-01-01 --saida almox.csv
+
+Com o backend Firestore (padrão de REQUIS_BACKEND), informe --chave.
+
+Gravando num arquivo, a memória usada fica em uma página (ou um bloco do
+Parquet), qualquer que seja o tamanho do histórico. O botão da aba Histórico
+entrega o arquivo pronto, inteiro em memória, e por isso limita o número de
+linhas.
+
+No CSV, separado por ';', os valores decimais saem com vírgula, como o Excel
+em português espera.
+"""
+import argparse
+import csv
+import io
+from datetime import timedelta
+from itertools import islice
+
+from itens import COLUNAS_ITEM, preparar_requisicao
+
+# Documentos lidos por página; a memória usada não depende do tamanho da coleção
+TAMANHO_PAGINA = 500
+
+# Linhas acumuladas antes de cada escrita no Parquet (um row group)
+LINHAS_POR_BLOCO = 5000
+
+COLUNAS = {
+    "requisicoes": [
+        'Número Solicitação', 'Data Solicitação', 'Nome do Solicitante', 'Métier', 'Tipo',
+        'Tipo de Compra', 'Linha de Projeto', 'Produto Novo ou Backup', 'Demanda Nova ou Prevista',
+        'Status', 'Valor Total', 'Comentários', 'Riscos', 'Orçamento', 'Item', *COLUNAS_ITEM,
+    ],
+    "almoxarifado": [
+        'Pedido', 'Item do Pedido', 'Data Solicitação', 'Nome do Solicitante', 'MABEC',
+        'Descrição do Produto', 'Quantidade',
+    ],
+}
+
+_INTEIROS = {'Item', 'Item do Pedido', 'Quantidade'}
+_DECIMAIS = {'Valor Total', 'Valor Unitário', 'Subtotal'}
+
+FORMATOS = ("csv", "parquet")
+
+
+class ParquetIndisponivel(RuntimeError):
+    """A exportação em Parquet precisa do pacote opcional pyarrow."""
+
+
+def parquet_disponivel():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def intervalo(de=None, ate=None):
+    """Limites em texto para 'Data Solicitação': ``de`` incluso e o dia ``ate`` inteiro."""
+    return (
+        de.strftime('%Y-%m-%d') if de else None,
+        (ate + timedelta(days=1)).strftime('%Y-%m-%d') if ate else None,
+    )
+
+
+def documentos(armazenamento, colecao, inicio=None, fim=None, status=None):
+    """Percorre a coleção em ordem de data, uma página de cada vez."""
+    cursor = None
+    while True:
+        pagina = armazenamento.pagina_por_data(colecao, TAMANHO_PAGINA, cursor, inicio, fim, status)
+        yield from pagina.documentos
+        if not pagina.tem_mais:
+            return
+        cursor = pagina.cursor
+
+
+def _orcamento(dados):
+    anexo = dados.get('Orçamento')
+    if isinstance(anexo, dict):
+        return anexo.get('nome', '')
+    return dados.get('Caminho Orçamento') or ''
+
+
+def linhas(armazenamento, colecao, inicio=None, fim=None, status=None):
+    """Uma linha por item; requisições sem itens saem numa linha com os campos do item vazios."""
+    if colecao == "almoxarifado":
+        yield from documentos(armazenamento, colecao, inicio, fim)
+        return
+    for dados in documentos(armazenamento, colecao, inicio, fim, status):
+        dados = preparar_requisicao(dados)
+        dados['Orçamento'] = _orcamento(dados)
+        if not dados['Itens']:
+            yield dados
+        for posicao, item in enumerate(dados['Itens'], start=1):
+            yield {**dados, 'Item': posicao, **item}
+
+
+def _valor(coluna, valor):
+    if valor is None or valor == '':
+        return None
+    try:
+        if coluna in _INTEIROS:
+            return int(valor)
+        if coluna in _DECIMAIS:
+            return float(valor)
+    except (TypeError, ValueError):
+        return None
+    return str(valor)
+
+
+def _valor_csv(coluna, valor):
+    valor = _valor(coluna, valor)
+    if coluna in _DECIMAIS and valor is not None:
+        # Sem notação científica nem dígitos perdidos, com a vírgula do pt-BR
+        return format(valor, ".15g").replace(".", ",")
+    return valor
+
+
+def escrever_csv(registros, destino, colunas):
+    # Texto UTF-8 com BOM: o Excel abre os acentos corretamente
+    texto = io.TextIOWrapper(destino, encoding="utf-8-sig", newline="", write_through=True)
+    escritor = csv.DictWriter(texto, fieldnames=colunas, extrasaction="ignore", delimiter=";")
+    escritor.writeheader()
+    total = 0
+    for registro in registros:
+        escritor.writerow({coluna: _valor_csv(coluna, registro.get(coluna)) for coluna in colunas})
+        total += 1
+    texto.detach()
+    return total
+
+
+def escrever_parquet(registros, destino, colunas):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError as erro:
+        raise ParquetIndisponivel("Instale o pacote pyarrow para exportar em Parquet.") from erro
+
+    esquema = pa.schema([
+        (coluna, pa.int64() if coluna in _INTEIROS else pa.float64() if coluna in _DECIMAIS else pa.string())
+        for coluna in colunas
+    ])
+    total = 0
+    with pq.ParquetWriter(destino, esquema) as escritor:
+        bloco = []
+        for registro in registros:
+            bloco.append({coluna: _valor(coluna, registro.get(coluna)) for coluna in colunas})
+            if len(bloco) == LINHAS_POR_BLOCO:
+                escritor.write_table(pa.Table.from_pylist(bloco, schema=esquema))
+                total += len(bloco)
+                bloco = []
+        if bloco or not total:
+            escritor.write_table(pa.Table.from_pylist(bloco, schema=esquema))
+            total += len(bloco)
+    return total
+
+
+def exportar(armazenamento, colecao, destino, formato="csv", inicio=None, fim=None, status=None, limite=None):
+    """Grava a exportação em ``destino`` (arquivo binário aberto); retorna o número de linhas.
+
+    Com ``limite``, para depois de tantas linhas (as mais antigas do período).
+    """
+    registros = linhas(armazenamento, colecao, inicio, fim, status)
+    if limite is not None:
+        registros = islice(registros, limite)
+    if formato == "parquet":
+        return escrever_parquet(registros, destino, COLUNAS[colecao])
+    return escrever_csv(registros, destino, COLUNAS[colecao])
+
+
+def main():
+    import sys
+    from datetime import date
+
+    from armazenamento import COLECOES, criar_armazenamento
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("colecao", choices=COLECOES)
+    parser.add_argument("--de", type=date.fromisoformat, help="primeiro dia (AAAA-MM-DD)")
+    parser.add_argument("--ate", type=date.fromisoformat, help="último dia, incluso (AAAA-MM-DD)")
+    parser.add_argument("--status", action="append", help="pode ser repetido; só para requisicoes")
+    parser.add_argument("--formato", choices=FORMATOS, default="csv")
+    parser.add_argument("--saida", default="-", help="arquivo de saída; '-' para a saída padrão (só CSV)")
+    parser.add_argument("--chave", help="arquivo JSON da conta de serviço do Firebase")
+    args = parser.parse_args()
+
+    def conectar_firestore():
+        from migracao import conectar
+        if not args.chave:
+            parser.error("--chave é obrigatório com o backend Firestore")
+        return conectar(args.chave)
+
+    armazenamento = criar_armazenamento(conectar_firestore=conectar_firestore)
+    inicio, fim = intervalo(args.de, args.ate)
+    if args.saida == "-":
+        if args.formato == "parquet":
+            parser.error("Parquet precisa de --saida com um arquivo")
+        total = exportar(armazenamento, args.colecao, sys.stdout.buffer, args.formato, inicio, fim, args.status)
+    else:
+        with open(args.saida, "wb") as destino:
+            total = exportar(armazenamento, args.colecao, destino, args.formato, inicio, fim, args.status)
+    print(f"{total} linhas exportadas.", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,241 @@
+import json
+import logging
+import os
+import random
+import threading
+import time
+import uuid
+
+from armazenamento import ErroArmazenamento, RequisicaoExistente
+
+logger = logging.getLogger("requisicoes.fila")
+
+# Quantas requisições cada gravação em lote leva
+TAMANHO_LOTE = 100
+
+# Por quantos dias rejeições e renumerações continuam no diário para consulta
+DIAS_AVISOS = 30
+
+
+def ler_diario(caminho):
+    """Reproduz o diário.
+
+    Retorna ({chave: dados} pendentes, {chave: {"dados", "em"}} rejeitados,
+    {chave: {"numero", "em"}} renumerados), com "em" no formato de
+    time.time(). A chave é sempre o número dado ao solicitante, mesmo depois
+    de a requisição ser renumerada.
+    """
+    pendentes, rejeitados, renumerados = {}, {}, {}
+    if not os.path.exists(caminho):
+        return pendentes, rejeitados, renumerados
+    with open(caminho, encoding="utf-8") as f:
+        for linha in f:
+            try:
+                registro = json.loads(linha)
+            except ValueError:
+                # Última linha cortada por uma queda no meio da escrita
+                continue
+            chave = registro["chave"]
+            # Diários antigos não têm "em": contam a partir de agora
+            em = registro.get("em", time.time())
+            if registro["tipo"] == "envio":
+                pendentes[chave] = registro["dados"]
+            elif registro["tipo"] == "renumerado":
+                renumerados[chave] = {"numero": registro["numero"], "em": em}
+                if chave in pendentes:
+                    pendentes[chave] = _renumerar(pendentes[chave], chave, registro["numero"])
+            elif registro["tipo"] == "descartado":
+                rejeitados.pop(chave, None)
+            else:
+                dados = pendentes.pop(chave, None)
+                if registro["tipo"] == "rejeitado" and dados is not None:
+                    rejeitados[chave] = {"dados": dados, "em": em}
+    return pendentes, rejeitados, renumerados
+
+
+def _renumerar(dados, original, numero):
+    return dict(dados, **{"Número Solicitação": numero, "Número Original": original})
+
+
+def _chave(dados):
+    return dados.get("Número Original", dados["Número Solicitação"])
+
+
+class FilaEnvios:
+    """Fila durável de requisições ainda não gravadas no armazenamento.
+
+    O envio é acrescentado a um diário JSONL (com fsync) e a sessão recebe a
+    confirmação na hora; uma thread de fundo grava os pendentes em lotes,
+    repetindo com espera exponencial enquanto o backend falhar. Cada envio
+    leva uma 'Chave Envio' única: se o lote for repetido depois de já ter
+    sido gravado, o documento existente é reconhecido e não vira duplicata.
+    Se o número já pertencer a outra requisição, o envio recebe um número novo
+    do ``alocador`` e guarda o original em 'Número Original'; sem alocador,
+    é rejeitado.
+
+    O diário é de um único processo; cada servidor deve ter o seu arquivo.
+    """
+
+    def __init__(self, caminho, armazenamento, alocador=None, espera_base=1.0, espera_maxima=60.0):
+        self.caminho = caminho
+        self._armazenamento = armazenamento
+        self._alocador = alocador
+        self._espera_base = espera_base
+        self._espera_maxima = espera_maxima
+        self._lock = threading.Lock()
+        self._acordar = threading.Event()
+        self.gravados = 0
+        self.falhas_seguidas = 0
+        self.ultimo_erro = None
+        self._pendentes, self.rejeitados, self.renumerados = ler_diario(caminho)
+        self._expirar()
+        if self._pendentes:
+            self._acordar.set()
+        self._thread = threading.Thread(target=self._trabalhar, daemon=True, name="fila-envios")
+        self._thread.start()
+
+    def _anotar(self, registros):
+        with open(self.caminho, "a", encoding="utf-8") as f:
+            for registro in registros:
+                f.write(json.dumps(registro, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def enfileirar(self, dados):
+        dados = dict(dados, **{"Chave Envio": uuid.uuid4().hex})
+        chave = dados["Número Solicitação"]
+        with self._lock:
+            self._anotar([{"tipo": "envio", "chave": chave, "dados": dados}])
+            self._pendentes[chave] = dados
+        self._acordar.set()
+        return chave
+
+    def pendentes(self):
+        with self._lock:
+            return list(self._pendentes.values())
+
+    def estatisticas(self):
+        with self._lock:
+            return {
+                "pendentes": len(self._pendentes),
+                "rejeitados": len(self.rejeitados),
+                "renumerados": len(self.renumerados),
+                "gravados": self.gravados,
+                "falhas_seguidas": self.falhas_seguidas,
+                "ultimo_erro": self.ultimo_erro,
+            }
+
+    def _confirmar(self, chaves, tipo="confirmado"):
+        em = time.time()
+        with self._lock:
+            self._anotar([{"tipo": tipo, "chave": chave, "em": em} for chave in chaves])
+            for chave in chaves:
+                dados = self._pendentes.pop(chave, None)
+                if tipo == "rejeitado":
+                    self.rejeitados[chave] = {"dados": dados, "em": em}
+                else:
+                    self.gravados += 1
+            if not self._pendentes:
+                self._expirar()
+                self._compactar()
+
+    def numero_gravado(self, numero):
+        """Número com que a requisição ``numero`` foi (ou será) gravada, se foi renumerada."""
+        with self._lock:
+            renumerado = self.renumerados.get(numero)
+        return renumerado and renumerado["numero"]
+
+    def rejeitado(self, numero):
+        """Indica se o envio ``numero`` foi rejeitado e ainda não foi descartado."""
+        with self._lock:
+            return numero in self.rejeitados
+
+    def descartar_rejeitado(self, numero):
+        # O solicitante já reenviou: o aviso sai do diário antes de expirar
+        with self._lock:
+            if self.rejeitados.pop(numero, None) is not None:
+                self._anotar([{"tipo": "descartado", "chave": numero}])
+
+    def _expirar(self):
+        limite = time.time() - DIAS_AVISOS * 86400
+        for avisos in (self.rejeitados, self.renumerados):
+            for chave in [chave for chave, aviso in avisos.items() if aviso["em"] < limite]:
+                del avisos[chave]
+
+    def _compactar(self):
+        # Com tudo gravado, o diário pode recomeçar só com rejeitados e renumerados
+        temporario = self.caminho + ".novo"
+        with open(temporario, "w", encoding="utf-8") as f:
+            for chave, aviso in self.renumerados.items():
+                f.write(json.dumps({"tipo": "renumerado", "chave": chave, **aviso}) + "\n")
+            for chave, aviso in self.rejeitados.items():
+                f.write(json.dumps({"tipo": "envio", "chave": chave, "dados": aviso["dados"]}, ensure_ascii=False) + "\n")
+                f.write(json.dumps({"tipo": "rejeitado", "chave": chave, "em": aviso["em"]}) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporario, self.caminho)
+
+    def _renumerar(self, dados):
+        # Anotado antes de gravar: se o processo cair depois da gravação, a
+        # retomada tenta o número novo, acha a própria 'Chave Envio' e confirma
+        chave = _chave(dados)
+        aviso = {"numero": self._alocador.proximo(), "em": time.time()}
+        numero = aviso["numero"]
+        with self._lock:
+            self._anotar([{"tipo": "renumerado", "chave": chave, **aviso}])
+            self.renumerados[chave] = aviso
+            dados = self._pendentes[chave] = _renumerar(dados, chave, numero)
+        logger.warning("Número %s já usado por outra requisição; gravando como %s", chave, numero)
+        return dados
+
+    def _gravar_um(self, dados):
+        while True:
+            try:
+                self._armazenamento.salvar_requisicao(dados)
+                return "confirmado"
+            except RequisicaoExistente:
+                existente = self._armazenamento.obter_requisicao(dados["Número Solicitação"])
+                if existente and existente.get("Chave Envio") == dados["Chave Envio"]:
+                    return "confirmado"
+                if self._alocador is None:
+                    logger.error("Número %s já usado por outra requisição", dados["Número Solicitação"])
+                    return "rejeitado"
+                dados = self._renumerar(dados)
+
+    def _gravar(self, lote):
+        try:
+            self._armazenamento.salvar_requisicoes(lote)
+            self._confirmar([_chave(dados) for dados in lote])
+        except RequisicaoExistente:
+            # Alguma já foi gravada antes (ou colidiu): resolve uma a uma
+            for dados in lote:
+                self._confirmar([_chave(dados)], self._gravar_um(dados))
+
+    def _trabalhar(self):
+        while True:
+            self._acordar.wait()
+            self._acordar.clear()
+            while True:
+                with self._lock:
+                    lote = list(self._pendentes.values())[:TAMANHO_LOTE]
+                if not lote:
+                    break
+                try:
+                    self._gravar(lote)
+                except Exception as erro:
+                    # Qualquer erro (rede, autenticação, retentativas esgotadas) só adia a
+                    # gravação: se a thread morresse, os envios ficariam parados até reiniciar
+                    with self._lock:
+                        self.falhas_seguidas += 1
+                        self.ultimo_erro = str(erro) or type(erro).__name__
+                        falhas = self.falhas_seguidas
+                    espera = min(self._espera_maxima, self._espera_base * 2 ** (falhas - 1))
+                    if isinstance(erro, ErroArmazenamento):
+                        logger.warning("Falha ao gravar a fila (%s); nova tentativa em %.0f s", erro, espera)
+                    else:
+                        logger.exception("Erro inesperado ao gravar a fila; nova tentativa em %.0f s", espera)
+                    time.sleep(espera * (1 + random.random() / 2))
+                else:
+                    with self._lock:
+                        self.falhas_seguidas = 0
+                        self.ultimo_erro = None
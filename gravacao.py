@@ -0,0 +1,278 @@
+import random
+import time
+
+from google.api_core.exceptions import (
+    Aborted, DeadlineExceeded, InternalServerError, ResourceExhausted, ServiceUnavailable
+)
+from google.cloud import firestore
+
+from agregados import (
+    CAMPOS, grupos_de, id_grupo, mabecs_de, precisa_reler_ultima, sem_efeito, total_mabec, variacao, variacao_mabec
+)
+from armazenamento import COLECAO_AGREGADOS, COLECAO_MABEC, gerar_id_pedido
+from consultas import CAMPO_DATA, numero_valido
+
+# Limite de operações por lote de escrita do Firestore
+LIMITE_LOTE = 500
+
+ERROS_TRANSITORIOS = (Aborted, DeadlineExceeded, InternalServerError, ResourceExhausted, ServiceUnavailable)
+
+
+def com_retentativa(funcao, tentativas=5, espera_base=0.2):
+    """Chama funcao() repetindo em erros transitórios, com espera exponencial.
+
+    Retorna (resultado, número de tentativas usadas).
+    """
+    for tentativa in range(1, tentativas + 1):
+        try:
+            return funcao(), tentativa
+        except ERROS_TRANSITORIOS:
+            if tentativa == tentativas:
+                raise
+            time.sleep(espera_base * 2 ** (tentativa - 1) * (1 + random.random()))
+
+
+def _numero(numero):
+    return str(numero).strip().upper()
+
+
+def _ajustar_agregados(escrita, db, ajuste):
+    # escrita é um WriteBatch ou Transaction; os incrementos entram no mesmo commit
+    colecao = db.collection(COLECAO_AGREGADOS)
+    for chave, (quantidade, valor) in sem_efeito(ajuste).items():
+        escrita.set(colecao.document(id_grupo(chave)), {
+            **dict(zip(CAMPOS, chave)),
+            "Quantidade": firestore.Increment(quantidade),
+            "Valor": firestore.Increment(valor),
+        }, merge=True)
+
+
+def salvar_requisicao(db, dados):
+    salvar_requisicoes(db, [dados])
+
+
+def salvar_requisicoes(db, lista):
+    """Cria várias requisições e soma cada uma ao seu grupo do painel.
+
+    Cada commit leva até LIMITE_LOTE // 2 requisições (mais os grupos) e é
+    atômico; se alguma já existir, o commit inteiro falha com AlreadyExists.
+    """
+    colecao = db.collection("requisicoes")
+    por_lote = LIMITE_LOTE // 2
+    for inicio in range(0, len(lista), por_lote):
+        parte = lista[inicio:inicio + por_lote]
+
+        def commit():
+            lote = db.batch()
+            ajuste = {}
+            for dados in parte:
+                # O número da solicitação é a chave do documento; create() falha se já existir
+                lote.create(colecao.document(_numero(dados['Número Solicitação'])), dados)
+                variacao(depois=dados, acumulado=ajuste)
+            _ajustar_agregados(lote, db, ajuste)
+            return lote.commit()
+        com_retentativa(commit)
+
+
+def atualizar_status(db, numero, status):
+    atualizados, _ = atualizar_status_em_lote(db, [numero], status)
+    return atualizados == 1
+
+
+def excluir_requisicao(db, numero):
+    numero = numero_valido(numero)
+    if numero is None:
+        return False
+    ref = db.collection("requisicoes").document(numero)
+
+    @firestore.transactional
+    def excluir(transacao):
+        doc = ref.get(transaction=transacao)
+        if not doc.exists:
+            return False
+        transacao.delete(ref)
+        _ajustar_agregados(transacao, db, variacao(antes=doc.to_dict()))
+        return True
+    return excluir(db.transaction())
+
+
+def atualizar_status_em_lote(db, numeros, status):
+    """Muda o status de vários números de uma vez, movendo-os de grupo no painel.
+
+    Cada transação lê e atualiza até LIMITE_LOTE // 3 números: cada um leva
+    o update e até dois grupos (o que perde e o que ganha), então o commit
+    nunca passa de LIMITE_LOTE escritas. Retorna
+    (atualizados, nao_encontrados); os inexistentes ficam de fora, já que um
+    update sem documento derrubaria a transação inteira. Números que não
+    podem ser ID de documento (com '/', por exemplo) contam como não encontrados.
+    """
+    numeros = list(dict.fromkeys(_numero(n) for n in numeros if str(n).strip()))
+    colecao = db.collection("requisicoes")
+
+    @firestore.transactional
+    def atualizar(transacao, refs):
+        ajuste = {}
+        encontrados = []
+        for doc in db.get_all(refs, transaction=transacao):
+            if not doc.exists:
+                continue
+            antes = doc.to_dict()
+            transacao.update(doc.reference, {"Status": status})
+            variacao(antes, dict(antes, Status=status), ajuste)
+            encontrados.append(doc.id)
+        _ajustar_agregados(transacao, db, ajuste)
+        return encontrados
+
+    encontrados = set()
+    por_lote = LIMITE_LOTE // 3
+    validos = [n for n in numeros if numero_valido(n)]
+    for inicio in range(0, len(validos), por_lote):
+        refs = [colecao.document(n) for n in validos[inicio:inicio + por_lote]]
+        encontrados.update(atualizar(db.transaction(), refs))
+
+    nao_encontrados = [n for n in numeros if n not in encontrados]
+    return len(encontrados), nao_encontrados
+
+
+def ler_agregados(db):
+    return grupos_de(doc.to_dict() for doc in db.collection(COLECAO_AGREGADOS).stream())
+
+
+def corrigir_agregados(db, totais):
+    colecao = db.collection(COLECAO_AGREGADOS)
+    itens = list(totais.items())
+    for inicio in range(0, len(itens), LIMITE_LOTE):
+        lote = db.batch()
+        for chave, (quantidade, valor) in itens[inicio:inicio + LIMITE_LOTE]:
+            ref = colecao.document(id_grupo(chave))
+            if quantidade:
+                lote.set(ref, {**dict(zip(CAMPOS, chave)), "Quantidade": quantidade, "Valor": valor})
+            else:
+                lote.delete(ref)
+        lote.commit()
+
+
+def _gravar_almox(db, gravar=(), apagar=()):
+    """Grava e apaga itens do almoxarifado numa transação, junto com os totais por MABEC.
+
+    Os itens são lidos antes: gravar um item igual ao que já existe, ou
+    apagar um que já sumiu, não muda os totais, então repetir a chamada
+    depois de uma falha não conta nada duas vezes.
+    """
+    colecao = db.collection("almoxarifado")
+    colecao_totais = db.collection(COLECAO_MABEC)
+    refs = [ref for ref, _ in gravar] + list(apagar)
+
+    @firestore.transactional
+    def executar(transacao):
+        # Todas as leituras antes de qualquer escrita, como exige o Firestore
+        existentes = {doc.id: doc.to_dict() for doc in db.get_all(refs, transaction=transacao) if doc.exists}
+        mudancas = {}
+        for ref, dados in gravar:
+            variacao_mabec(ref.id, existentes.get(ref.id), dados, mudancas)
+        for ref in apagar:
+            variacao_mabec(ref.id, existentes.get(ref.id), None, mudancas)
+
+        refs_totais = {codigo: colecao_totais.document(id_grupo((codigo,))) for codigo in mudancas}
+        atuais = {}
+        if refs_totais:
+            atuais = {
+                doc.id: doc.to_dict()
+                for doc in db.get_all(list(refs_totais.values()), transaction=transacao) if doc.exists
+            }
+        novos = {}
+        for codigo, mudanca in mudancas.items():
+            atual = atuais.get(refs_totais[codigo].id)
+            restante = None
+            if precisa_reler_ultima(atual, mudanca):
+                # Só os itens mais recentes deste MABEC (índice MABEC + Data Solicitação)
+                consulta = (
+                    colecao.where("MABEC", "==", codigo)
+                    .order_by(CAMPO_DATA, direction="DESCENDING")
+                    .limit(len(mudanca["removidos"]) + 1)
+                )
+                restante = next((
+                    doc.get(CAMPO_DATA) for doc in transacao.get(consulta)
+                    if doc.id not in mudanca["removidos"]
+                ), None)
+            novos[codigo] = total_mabec(atual, mudanca, restante)
+
+        for ref, dados in gravar:
+            transacao.set(ref, dados)
+        for ref in apagar:
+            if ref.id in existentes:
+                transacao.delete(ref)
+        for codigo, total in novos.items():
+            if total is None:
+                transacao.delete(refs_totais[codigo])
+            else:
+                transacao.set(refs_totais[codigo], {"MABEC": codigo, **total})
+        return len(existentes)
+
+    return com_retentativa(lambda: executar(db.transaction()))
+
+
+def enviar_pedido_almox(db, itens, pedido=None):
+    """Grava os itens de um pedido de almoxarifado em transações de até LIMITE_LOTE // 2 itens.
+
+    Todos os itens recebem o mesmo 'Pedido' e IDs determinísticos
+    (``{pedido}-{n:03d}``), então repetir uma transação não duplica nada.
+    Cada transação leva também os totais dos MABECs envolvidos. Nos pedidos
+    maiores, se uma transação falhar de vez, os itens já gravados são
+    apagados (e descontados dos totais) antes de relançar o erro, para não
+    sobrar pedido pela metade.
+
+    Retorna (pedido, commits), com itens, ms e tentativas de cada commit.
+    """
+    pedido = pedido or gerar_id_pedido()
+    colecao = db.collection("almoxarifado")
+    docs = [
+        (colecao.document(f"{pedido}-{n:03d}"), dict(item, **{"Pedido": pedido, "Item do Pedido": n}))
+        for n, item in enumerate(itens, start=1)
+    ]
+
+    por_lote = LIMITE_LOTE // 2
+    commits = []
+    gravados = 0
+    try:
+        for inicio in range(0, len(docs), por_lote):
+            parte = docs[inicio:inicio + por_lote]
+            t0 = time.perf_counter()
+            _, tentativas = _gravar_almox(db, gravar=parte)
+            commits.append({
+                "itens": len(parte),
+                "ms": (time.perf_counter() - t0) * 1000,
+                "tentativas": tentativas,
+            })
+            gravados += len(parte)
+    except Exception:
+        for inicio in range(0, gravados, por_lote):
+            _gravar_almox(db, apagar=[ref for ref, _ in docs[inicio:min(gravados, inicio + por_lote)]])
+        raise
+    return pedido, commits
+
+
+def excluir_almox(db, doc_id):
+    existia, _ = _gravar_almox(db, apagar=[db.collection("almoxarifado").document(doc_id)])
+    return existia == 1
+
+
+def ler_totais_mabec(db):
+    return mabecs_de(doc.to_dict() for doc in db.collection(COLECAO_MABEC).stream())
+
+
+def corrigir_totais_mabec(db, totais):
+    """Substitui todos os totais por MABEC pelos informados (ver agregados.somar_mabec)."""
+    colecao = db.collection(COLECAO_MABEC)
+    apagar = [doc.reference for doc in colecao.stream()]
+    for inicio in range(0, len(apagar), LIMITE_LOTE):
+        lote = db.batch()
+        for ref in apagar[inicio:inicio + LIMITE_LOTE]:
+            lote.delete(ref)
+        lote.commit()
+    itens = list(totais.items())
+    for inicio in range(0, len(itens), LIMITE_LOTE):
+        lote = db.batch()
+        for codigo, total in itens[inicio:inicio + LIMITE_LOTE]:
+            lote.set(colecao.document(id_grupo((codigo,))), {"MABEC": codigo, **total})
+        lote.commit()
@@ -0,0 +1,86 @@
+import re
+import threading
+from bisect import bisect_left, insort
+
+from consultas import FIM_PREFIXO, normalizar
+
+# Campos de texto livre pesquisáveis, além das descrições dos itens
+CAMPOS_INDEXADOS = ('Linha de Projeto', 'Comentários', 'Riscos')
+
+_PALAVRA = re.compile(r"\w+")
+
+
+def termos(texto):
+    """Palavras sem acento e em minúsculas, na ordem em que aparecem."""
+    return _PALAVRA.findall(normalizar(texto))
+
+
+def termos_documento(dados):
+    textos = [dados.get(campo) for campo in CAMPOS_INDEXADOS]
+    textos += [item.get('Descrição') for item in dados.get('Itens') or [] if isinstance(item, dict)]
+    return {termo for texto in textos if texto for termo in termos(texto)}
+
+
+class IndiceTexto:
+    """Índice invertido em memória: palavra -> IDs dos documentos que a contêm.
+
+    É alimentado pelas mudanças do espelho (ver ``EspelhoColecao.inscrever``),
+    então cada alteração reindexa só o documento alterado. Os documentos já
+    devem ter passado por ``preparar_requisicao`` (Itens como lista).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postagens = {}
+        self._termos_doc = {}
+        # Vocabulário ordenado, para achar por bisseção as palavras com um prefixo
+        self._vocabulario = []
+
+    def atualizar(self, mudancas):
+        with self._lock:
+            for doc_id, dados in mudancas:
+                novos = termos_documento(dados) if dados is not None else set()
+                antigos = self._termos_doc.pop(doc_id, set())
+                for termo in antigos - novos:
+                    ids = self._postagens[termo]
+                    ids.discard(doc_id)
+                    if not ids:
+                        del self._postagens[termo]
+                        del self._vocabulario[bisect_left(self._vocabulario, termo)]
+                for termo in novos - antigos:
+                    if termo not in self._postagens:
+                        self._postagens[termo] = set()
+                        insort(self._vocabulario, termo)
+                    self._postagens[termo].add(doc_id)
+                if novos:
+                    self._termos_doc[doc_id] = novos
+
+    def _com_prefixo(self, prefixo):
+        inicio = bisect_left(self._vocabulario, prefixo)
+        fim = bisect_left(self._vocabulario, prefixo + FIM_PREFIXO, inicio)
+        if fim - inicio == 1:
+            return self._postagens[self._vocabulario[inicio]]
+        encontrados = set()
+        for termo in self._vocabulario[inicio:fim]:
+            encontrados |= self._postagens[termo]
+        return encontrados
+
+    def buscar(self, consulta):
+        """IDs dos documentos que têm, para cada palavra da consulta, alguma palavra
+        começando por ela. Consulta vazia devolve None (sem filtro)."""
+        prefixos = set(termos(consulta))
+        if not prefixos:
+            return None
+        with self._lock:
+            # Começa pelo conjunto menor: a interseção custa o tamanho do resultado
+            conjuntos = sorted((self._com_prefixo(prefixo) for prefixo in prefixos), key=len)
+            resultado = set(conjuntos[0])
+            for ids in conjuntos[1:]:
+                if not resultado:
+                    break
+                resultado &= ids
+            return resultado
+
+    def estatisticas(self):
+        with self._lock:
+            return {"documentos": len(self._termos_doc), "palavras": len(self._vocabulario)}
@@ -0,0 +1,63 @@
+import ast
+
+from desempenho import etapa
+
+COLUNAS_ITEM = ['Descrição', 'Quantidade', 'Valor Unitário', 'Subtotal']
+
+# Nomes de campo gravados com grafia diferente por versões antigas do app
+_CAMPOS_ANTIGOS = {
+    'Caminho orçamento': 'Caminho Orçamento',
+    'Tipo de compra': 'Tipo de Compra',
+}
+
+
+def _item(item):
+    quantidade = int(item.get('Quantidade') or 0)
+    valor_unitario = float(item.get('Valor Unitário') or 0.0)
+    subtotal = item.get('Subtotal')
+    return {
+        'Descrição': str(item.get('Descrição') or ''),
+        'Quantidade': quantidade,
+        'Valor Unitário': valor_unitario,
+        'Subtotal': float(subtotal) if subtotal is not None else quantidade * valor_unitario,
+    }
+
+
+def converter_itens(valor):
+    """Lista de itens a partir do formato nativo ou do antigo texto str(list)."""
+    if isinstance(valor, str):
+        try:
+            with etapa("itens.literal_eval"):
+                valor = ast.literal_eval(valor) if valor.strip() else []
+        except (ValueError, SyntaxError):
+            return []
+    if not isinstance(valor, list):
+        return []
+    return [_item(item) for item in valor if isinstance(item, dict)]
+
+
+def preparar_requisicao(dados):
+    # Chamado uma vez por documento quando ele chega ao espelho
+    for antigo, atual in _CAMPOS_ANTIGOS.items():
+        if antigo in dados:
+            dados.setdefault(atual, dados.pop(antigo))
+    dados['Itens'] = converter_itens(dados.get('Itens'))
+    return dados
+
+
+def tabela_itens(documentos):
+    """Uma linha por item, indexada pelo número da solicitação."""
+    import pandas as pd
+
+    with etapa("itens.montar_tabela"):
+        linhas = [
+            {'Número Solicitação': doc.get('Número Solicitação'), 'Item': posicao, **item}
+            for doc in documentos
+            for posicao, item in enumerate(doc.get('Itens') or [], start=1)
+        ]
+        tabela = pd.DataFrame(linhas, columns=['Número Solicitação', 'Item', *COLUNAS_ITEM])
+        return tabela.set_index('Número Solicitação').sort_index()
+
+
+def resumir_itens(itens):
+    return "; ".join(f"{item['Quantidade']}× {item['Descrição']}" for item in converter_itens(itens))
@@ -0,0 +1,155 @@
+"""Ferramentas de manutenção da base de requisições.
+
+Uso:
+    python migracao.py --chave chave-firebase.json nome-busca
+    python migracao.py --chave chave-firebase.json rechavear
+    python migracao.py --chave chave-firebase.json itens
+    python migracao.py --chave chave-firebase.json copiar-sqlite --destino requisicoes.db
+    python migracao.py --chave chave-firebase.json agregados [--corrigir]
+    python migracao.py --chave chave-firebase.json totais-mabec
+"""
+import argparse
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+from agregados import CAMPOS, reconciliar, reconciliar_mabec
+from armazenamento import COLECOES
+from consultas import normalizar
+from itens import converter_itens
+from gravacao import LIMITE_LOTE
+
+
+def conectar(caminho_chave):
+    if not firebase_admin._apps:
+        firebase_admin.initialize_app(credentials.Certificate(caminho_chave))
+    return firestore.client()
+
+
+def preencher_nome_busca(db):
+    """Grava 'Nome Busca' nos documentos antigos que ainda não têm o campo."""
+    lote = db.batch()
+    pendentes = 0
+    total = 0
+    for doc in db.collection("requisicoes").stream():
+        dados = doc.to_dict()
+        nome_busca = normalizar(dados.get("Nome do Solicitante"))
+        if dados.get("Nome Busca") == nome_busca:
+            continue
+        lote.update(doc.reference, {"`Nome Busca`": nome_busca})
+        pendentes += 1
+        total += 1
+        if pendentes == LIMITE_LOTE:
+            lote.commit()
+            lote = db.batch()
+            pendentes = 0
+    if pendentes:
+        lote.commit()
+    return total
+
+
+def rechavear(db):
+    """Move cada requisição para um documento cujo ID é o número da solicitação.
+
+    Cada documento movido custa duas operações (set + delete), então cada lote
+    leva no máximo LIMITE_LOTE // 2 documentos. Números repetidos ou vazios
+    não são movidos e voltam na lista de conflitos para tratamento manual.
+    """
+    colecao = db.collection("requisicoes")
+    docs = list(colecao.stream())
+    ids_existentes = {doc.id for doc in docs}
+    destinos = set()
+    conflitos = []
+    movidos = 0
+
+    lote = db.batch()
+    pendentes = 0
+    for doc in docs:
+        dados = doc.to_dict()
+        numero = str(dados.get("Número Solicitação") or "").strip().upper()
+        if doc.id == numero:
+            continue
+        if not numero or numero in ids_existentes or numero in destinos:
+            conflitos.append((doc.id, numero))
+            continue
+        destinos.add(numero)
+        lote.set(colecao.document(numero), dados)
+        lote.delete(doc.reference)
+        pendentes += 1
+        movidos += 1
+        if pendentes == LIMITE_LOTE // 2:
+            lote.commit()
+            lote = db.batch()
+            pendentes = 0
+    if pendentes:
+        lote.commit()
+    return movidos, conflitos
+
+
+def converter_itens_texto(db):
+    """Troca o campo 'Itens' gravado como texto str(list) por uma lista de mapas."""
+    lote = db.batch()
+    pendentes = 0
+    total = 0
+    for doc in db.collection("requisicoes").stream():
+        itens = doc.to_dict().get("Itens")
+        if isinstance(itens, list):
+            continue
+        lote.update(doc.reference, {"Itens": converter_itens(itens)})
+        pendentes += 1
+        total += 1
+        if pendentes == LIMITE_LOTE:
+            lote.commit()
+            lote = db.batch()
+            pendentes = 0
+    if pendentes:
+        lote.commit()
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--chave", required=True, help="arquivo JSON da conta de serviço do Firebase")
+    parser.add_argument("comando", choices=["nome-busca", "rechavear", "itens", "copiar-sqlite", "agregados", "totais-mabec"])
+    parser.add_argument("--destino", default="requisicoes.db", help="arquivo SQLite usado por copiar-sqlite")
+    parser.add_argument("--corrigir", action="store_true", help="regrava os totais divergentes (agregados)")
+    args = parser.parse_args()
+
+    db = conectar(args.chave)
+    if args.comando == "nome-busca":
+        print(f"{preencher_nome_busca(db)} documentos atualizados.")
+    elif args.comando == "rechavear":
+        movidos, conflitos = rechavear(db)
+        print(f"{movidos} documentos movidos.")
+        for doc_id, numero in conflitos:
+            print(f"Conflito: documento {doc_id} com número '{numero}' não foi movido.")
+    elif args.comando == "itens":
+        print(f"{converter_itens_texto(db)} documentos convertidos.")
+    elif args.comando == "copiar-sqlite":
+        # Cópia local para rodar com REQUIS_BACKEND=sqlite
+        from armazenamento_sqlite import ArmazenamentoSQLite
+        destino = ArmazenamentoSQLite(args.destino)
+        for colecao in COLECOES:
+            documentos = {doc.id: doc.to_dict() for doc in db.collection(colecao).stream()}
+            destino.importar(colecao, documentos)
+            print(f"{colecao}: {len(documentos)} documentos copiados para {args.destino}.")
+    elif args.comando == "agregados":
+        # Para rodar periodicamente (cron): recontar e comparar com os totais do painel
+        from armazenamento_firestore import ArmazenamentoFirestore
+        divergentes = reconciliar(ArmazenamentoFirestore(db), corrigir=args.corrigir)
+        for chave, gravado, esperado in divergentes:
+            grupo = ", ".join(f"{campo}={valor!r}" for campo, valor in zip(CAMPOS, chave))
+            print(f"{grupo}: gravado {gravado[0]} / {gravado[1]:.2f}, esperado {esperado[0]} / {esperado[1]:.2f}")
+        print(f"{len(divergentes)} grupos divergentes{' corrigidos' if args.corrigir and divergentes else ''}.")
+        if divergentes and not args.corrigir:
+            raise SystemExit(1)
+    elif args.comando == "totais-mabec":
+        # Carga inicial (ou refação) da demanda por MABEC; depois ela é mantida a cada gravação
+        from armazenamento_firestore import ArmazenamentoFirestore
+        armazenamento = ArmazenamentoFirestore(db)
+        divergentes = reconciliar_mabec(armazenamento, corrigir=True)
+        print(f"{len(divergentes)} MABECs divergentes corrigidos.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+import os
+import threading
+import time
+import uuid
+from datetime import datetime
+
+# Até quantos números um processo gera no mesmo segundo
+SEQUENCIA_MAXIMA = 999
+
+
+def identificador_no():
+    """Seis caracteres que identificam este processo entre os demais.
+
+    Sem REQUIS_NO, são 24 bits aleatórios sorteados uma vez por processo:
+    não dependem de máquina nem PID (um contêiner reiniciado sorteia outro),
+    mas dois processos ainda podem sortear o mesmo valor, com chance de
+    cerca de n²/33 milhões para n processos. Com vários processos gravando
+    na mesma base, defina REQUIS_NO com um valor diferente em cada um para
+    ter a garantia.
+    """
+    no = os.environ.get("REQUIS_NO")
+    if no:
+        return no.strip().upper()[:6]
+    return uuid.uuid4().hex[:6].upper()
+
+
+class AlocadorNumeros:
+    """Gera números REQ-AAAAMMDDHHMMSS-NNNNNN-SSS sem consultar o banco.
+
+    NNNNNN é o identificador do processo (ver ``identificador_no``) e SSS uma
+    sequência dentro do segundo: dois envios no mesmo segundo, na mesma
+    sessão ou em sessões do mesmo processo, nunca recebem o mesmo número, e
+    processos diferentes só colidem se tiverem o mesmo identificador. Dentro
+    de um processo, a ordem alfabética segue a ordem de criação.
+    """
+
+    def __init__(self, no=None, relogio=time.time):
+        self.no = no or identificador_no()
+        self._relogio = relogio
+        self._lock = threading.Lock()
+        self._segundo = 0
+        self._sequencia = 0
+
+    def proximo(self):
+        with self._lock:
+            # Nunca volta no tempo, mesmo se o relógio do sistema for ajustado
+            segundo = max(int(self._relogio()), self._segundo)
+            if segundo == self._segundo:
+                self._sequencia += 1
+                if self._sequencia > SEQUENCIA_MAXIMA:
+                    segundo += 1
+                    self._sequencia = 1
+            else:
+                self._sequencia = 1
+            self._segundo = segundo
+            sequencia = self._sequencia
+        carimbo = datetime.fromtimestamp(segundo).strftime('%Y%m%d%H%M%S')
+        return f"REQ-{carimbo}-{self.no}-{sequencia:03d}"
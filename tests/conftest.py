@@ -0,0 +1,39 @@
+import os
+import sys
+
+import pytest
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+sys.path.insert(0, os.path.join(RAIZ, "benchmark"))
+
+
+@pytest.fixture(params=["sqlite", "firestore"])
+def armazenamento(request, tmp_path, monkeypatch):
+    """Os dois backends: SQLite num arquivo temporário e o Firestore em memória do benchmark."""
+    if request.param == "sqlite":
+        from armazenamento_sqlite import ArmazenamentoSQLite
+        return ArmazenamentoSQLite(str(tmp_path / "requisicoes.db"))
+
+    from google.cloud import firestore
+
+    import firestore_memoria
+    from armazenamento_firestore import ArmazenamentoFirestore
+    monkeypatch.setattr(firestore, "transactional", firestore_memoria.transactional)
+    return ArmazenamentoFirestore(firestore_memoria.BancoMemoria())
+
+
+def requisicao(numero, **campos):
+    dados = {
+        "Número Solicitação": numero,
+        "Nome do Solicitante": "Ana Lima",
+        "Métier": "Manutenção",
+        "Tipo": "Material",
+        "Tipo de Compra": "Regulares",
+        "Status": "Aprovação Comitê de Compras",
+        "Data Solicitação": "2026-03-10 09:00:00",
+        "Itens": [{"Descrição": "Parafuso", "Quantidade": 2, "Valor Unitário": 1.5, "Subtotal": 3.0}],
+        "Valor Total": 3.0,
+    }
+    dados.update(campos)
+    return dados
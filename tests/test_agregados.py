@@ -0,0 +1,63 @@
+from agregados import reconciliar, reconciliar_mabec
+from conftest import requisicao
+
+
+def item(mabec, quantidade, data):
+    return {
+        "Nome do Solicitante": "Ana Lima",
+        "MABEC": mabec,
+        "Descrição do Produto": "Luva",
+        "Quantidade": quantidade,
+        "Data Solicitação": data,
+    }
+
+
+def test_agregados_sem_divergencia_apos_criar_mudar_status_e_excluir(armazenamento):
+    armazenamento.salvar_requisicao(requisicao("REQ-1"))
+    armazenamento.salvar_requisicoes([
+        requisicao("REQ-2", **{"Métier": "Qualidade", "Valor Total": 10.0}),
+        requisicao("REQ-3", **{"Data Solicitação": "2026-04-02 14:30:00"}),
+    ])
+    assert reconciliar(armazenamento) == []
+
+    armazenamento.atualizar_status("REQ-1", "Pedido Emitido")
+    armazenamento.atualizar_status_em_lote(["REQ-2", "REQ-3"], "Pago")
+    assert reconciliar(armazenamento) == []
+
+    armazenamento.excluir_requisicao("REQ-2")
+    assert reconciliar(armazenamento) == []
+
+
+def test_reconciliar_corrige_grupo_divergente(armazenamento):
+    armazenamento.salvar_requisicao(requisicao("REQ-1"))
+    (chave, total), = armazenamento.agregados().items()
+    armazenamento.corrigir_agregados({chave: [5, 99.0]})
+
+    assert reconciliar(armazenamento, corrigir=True) == [(chave, [5, 99.0], [1, 3.0])]
+    assert reconciliar(armazenamento) == []
+
+
+def test_total_mabec_apos_excluir_o_item_mais_recente(armazenamento):
+    armazenamento.enviar_pedido_almox([item("MB1", 2, "2026-03-01 08:00:00"), item("MB2", 1, "2026-03-01 08:00:00")])
+    armazenamento.enviar_pedido_almox([item("MB1", 3, "2026-03-05 10:00:00")])
+    armazenamento.enviar_pedido_almox([item("MB1", 4, "2026-03-09 16:00:00")])
+    mais_recente = next(
+        doc_id for doc_id, dados in armazenamento.listar("almoxarifado").items()
+        if dados["Data Solicitação"] == "2026-03-09 16:00:00"
+    )
+
+    assert armazenamento.excluir_almox(mais_recente)
+
+    assert armazenamento.totais_mabec()["MB1"] == {
+        "Quantidade Total": 5, "Solicitações": 2, "Última Solicitação": "2026-03-05 10:00:00",
+    }
+    assert reconciliar_mabec(armazenamento) == []
+
+
+def test_reconciliar_mabec_recria_totais(armazenamento):
+    armazenamento.enviar_pedido_almox([item("MB1", 2, "2026-03-01 08:00:00")])
+    esperado = armazenamento.totais_mabec()["MB1"]
+    armazenamento.corrigir_totais_mabec({})
+
+    assert reconciliar_mabec(armazenamento, corrigir=True) == [("MB1", None, esperado)]
+    assert armazenamento.totais_mabec() == {"MB1": esperado}
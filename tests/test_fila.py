@@ -0,0 +1,41 @@
+import json
+
+from fila import ler_diario
+
+
+def test_ler_diario_ignora_ultima_linha_cortada(tmp_path):
+    caminho = tmp_path / "fila.jsonl"
+    registros = [
+        {"tipo": "envio", "chave": "REQ-1", "dados": {"Número Solicitação": "REQ-1"}},
+        {"tipo": "envio", "chave": "REQ-2", "dados": {"Número Solicitação": "REQ-2"}},
+        {"tipo": "envio", "chave": "REQ-3", "dados": {"Número Solicitação": "REQ-3"}},
+        {"tipo": "confirmado", "chave": "REQ-1"},
+        {"tipo": "rejeitado", "chave": "REQ-2", "em": 1000.0},
+    ]
+    texto = "".join(json.dumps(registro) + "\n" for registro in registros)
+    # A queda interrompeu a confirmação de REQ-3 no meio da linha
+    caminho.write_text(texto + '{"tipo": "confirmado", "cha', encoding="utf-8")
+
+    pendentes, rejeitados, renumerados = ler_diario(str(caminho))
+
+    assert pendentes == {"REQ-3": {"Número Solicitação": "REQ-3"}}
+    assert rejeitados == {"REQ-2": {"dados": {"Número Solicitação": "REQ-2"}, "em": 1000.0}}
+    assert renumerados == {}
+
+
+def test_ler_diario_aplica_renumeracao_ao_pendente(tmp_path):
+    caminho = tmp_path / "fila.jsonl"
+    registros = [
+        {"tipo": "envio", "chave": "REQ-1", "dados": {"Número Solicitação": "REQ-1"}},
+        {"tipo": "renumerado", "chave": "REQ-1", "numero": "REQ-9", "em": 1000.0},
+    ]
+    caminho.write_text("".join(json.dumps(registro) + "\n" for registro in registros), encoding="utf-8")
+
+    pendentes, _, renumerados = ler_diario(str(caminho))
+
+    assert pendentes == {"REQ-1": {"Número Solicitação": "REQ-9", "Número Original": "REQ-1"}}
+    assert renumerados == {"REQ-1": {"numero": "REQ-9", "em": 1000.0}}
+
+
+def test_ler_diario_sem_arquivo(tmp_path):
+    assert ler_diario(str(tmp_path / "nao_existe.jsonl")) == ({}, {}, {})
@@ -0,0 +1,27 @@
+from numeracao import SEQUENCIA_MAXIMA, AlocadorNumeros
+
+# Um instante fixo qualquer; o teste só olha o avanço do segundo
+INSTANTE = 1773133200.0
+
+
+def test_sequencia_passa_para_o_segundo_seguinte_depois_de_999():
+    alocador = AlocadorNumeros(no="ABC123", relogio=lambda: INSTANTE)
+
+    numeros = [alocador.proximo() for _ in range(SEQUENCIA_MAXIMA + 2)]
+
+    assert len(set(numeros)) == len(numeros)
+    assert numeros == sorted(numeros)
+    carimbo = numeros[0].split("-")[1]
+    assert numeros[SEQUENCIA_MAXIMA - 1] == f"REQ-{carimbo}-ABC123-999"
+    seguinte = numeros[SEQUENCIA_MAXIMA].split("-")
+    assert int(seguinte[1]) > int(carimbo) and seguinte[3] == "001"
+    assert numeros[-1].endswith("-002")
+
+
+def test_relogio_atrasado_nao_repete_numero():
+    instantes = iter([INSTANTE + 5, INSTANTE])
+    alocador = AlocadorNumeros(no="ABC123", relogio=lambda: next(instantes))
+
+    primeiro, segundo = alocador.proximo(), alocador.proximo()
+
+    assert segundo > primeiro